@@ -0,0 +1,148 @@
+import asyncio
+from pathlib import Path
+from typing import Callable
+
+import aiohttp
+
+
+class RateLimiter:
+    """Spaces out request starts so that at most `rate` requests begin per second."""
+
+    def __init__(self, rate: float | None):
+        self._interval = 1 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self._interval:
+            return
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+                now = loop.time()
+            self._next_slot = max(now, self._next_slot) + self._interval
+
+
+class AsyncDownloader:
+    """Async HTTP client with a shared connection pool, a bound on concurrent
+    connections and optional rate limiting.
+
+    Use it as an async context manager so the pool is reused for every request:
+
+        async with AsyncDownloader(max_connections=8, rate_limit=10) as dl:
+            await asyncio.gather(*(dl.fetch(url, path) for url, path in jobs))
+
+    Args:
+        max_connections (int): Maximum number of open connections
+        rate_limit (float | None): Maximum number of requests started per second, None for no limit
+        retries (int): How often a failed request is retried before giving up
+        timeout (float): Total timeout per request in seconds
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 8,
+        rate_limit: float | None = None,
+        retries: int = 3,
+        timeout: float = 120,
+    ):
+        self.max_connections = max_connections
+        self.retries = retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._limiter = RateLimiter(rate_limit)
+        self._session = None
+
+    async def __aenter__(self) -> "AsyncDownloader":
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections, limit_per_host=self.max_connections
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout, raise_for_status=True
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._session.close()
+        self._session = None
+
+    async def _retry(self, request: Callable):
+        for attempt in range(self.retries + 1):
+            await self._limiter.wait()
+            try:
+                return await request()
+            except aiohttp.ClientResponseError as e:
+                # Client errors other than rate limiting will not go away by retrying
+                if (e.status < 500 and e.status != 429) or attempt == self.retries:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(2**attempt)
+
+    async def get_json(self, url: str, params: dict | None = None) -> dict:
+        """Fetches a JSON document
+
+        Args:
+            url (str): URL of the document
+            params (dict | None): Query parameters
+
+        Returns:
+            dict: The decoded JSON
+        """
+
+        async def request():
+            async with self._session.get(url, params=params) as response:
+                return await response.json()
+
+        return await self._retry(request)
+
+    async def fetch(self, url: str, path: Path) -> int:
+        """Downloads url to path. The body is streamed into a .part file that is only
+        renamed to path once it is complete, so interrupted downloads never look finished.
+
+        Args:
+            url (str): URL of the file
+            path (Path): Target file
+
+        Returns:
+            int: Number of bytes written
+        """
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".part")
+
+        async def request():
+            async with self._session.get(url) as response:
+                size = 0
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(1 << 16):
+                        f.write(chunk)
+                        size += len(chunk)
+
+                if response.content_length is not None and size != response.content_length:
+                    raise aiohttp.ClientPayloadError(
+                        f"Got {size} of {response.content_length} bytes from {url}"
+                    )
+                return size
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            size = await self._retry(request)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        tmp_path.replace(path)
+        return size
+
+    async def try_fetch(self, url: str, path: Path) -> tuple[int | None, Exception | None]:
+        """Like fetch, but returns network and file errors instead of raising them
+
+        Returns:
+            tuple[int | None, Exception | None]: Number of bytes written and the error, one of them is None
+        """
+        try:
+            return await self.fetch(url, path), None
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            return None, e
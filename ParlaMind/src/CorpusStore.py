@@ -0,0 +1,195 @@
+import hashlib
+import shutil
+from datetime import date
+from pathlib import Path
+from typing import Sequence
+
+import polars as pl
+
+CORPUS_PATH = Path("./data/formated/corpus")
+
+ENUM_COLUMNS = ("abbreviation", "firstName", "lastName", "speakerId")
+
+# First sitting day of every Wahlperiode of the Bundestag
+WAHLPERIODEN_START = [
+    date(1949, 9, 7),
+    date(1953, 10, 6),
+    date(1957, 10, 15),
+    date(1961, 10, 17),
+    date(1965, 10, 19),
+    date(1969, 10, 20),
+    date(1972, 12, 13),
+    date(1976, 12, 14),
+    date(1980, 11, 4),
+    date(1983, 3, 29),
+    date(1987, 2, 18),
+    date(1990, 12, 20),
+    date(1994, 11, 10),
+    date(1998, 10, 26),
+    date(2002, 10, 17),
+    date(2005, 10, 18),
+    date(2009, 10, 27),
+    date(2013, 10, 22),
+    date(2017, 10, 24),
+    date(2021, 10, 26),
+    date(2025, 3, 25),
+]
+
+
+def wahlperiode(date_expr: pl.Expr) -> pl.Expr:
+    """Number of the Wahlperiode a date belongs to"""
+    return (
+        pl.lit(pl.Series(WAHLPERIODEN_START))
+        .search_sorted(date_expr, side="right")
+        .cast(pl.Int64)
+    )
+
+
+def speech_hash(speeches: pl.Series) -> pl.Series:
+    """64 bit blake2b hash of every speech text. Unlike pl.Series.hash it is stable across
+    polars versions and processes, so it can key caches of later stages that outlive a run.
+
+    Args:
+        speeches (pl.Series): The speech texts
+
+    Returns:
+        pl.Series: The hashes as UInt64 named speechHash, null for missing texts
+    """
+    return pl.Series(
+        "speechHash",
+        [
+            None
+            if text is None
+            else int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+            for text in speeches
+        ],
+        dtype=pl.UInt64,
+    )
+
+
+def encode_corpus(df_parla: pl.DataFrame) -> pl.DataFrame:
+    """Stores party, speaker names and ids as pl.Enum, whose categories are all values of
+    the corpus. Every value is kept once in a dictionary and the rows only hold small
+    integer codes. As the dictionary is the same in every file of the store, it survives
+    the round trip through Parquet and scans over many partitions need no re-encoding."""
+    return df_parla.with_columns(
+        pl.col(column).cast(
+            pl.Enum(df_parla[column].cast(pl.String).unique().drop_nulls().sort())
+        )
+        for column in ENUM_COLUMNS
+    )
+
+
+def write_corpus(
+    df_parla: pl.DataFrame, path: Path = CORPUS_PATH, row_group_size: int = 10_000
+) -> None:
+    """Writes the corpus partitioned as wahlperiode=<n>/year=<yyyy>/part-0.parquet.
+
+    Inside a partition the speeches are sorted by party and date and written with
+    row group statistics, so scans filtering on abbreviation or date skip most row groups.
+    The old store is only replaced once the new one is complete.
+
+    Args:
+        df_parla (pl.DataFrame): The corpus as returned by FileProcessor.concat_od_with_xml, see encode_corpus
+        path (Path): Root folder of the store
+        row_group_size (int): Number of speeches per row group
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    df_parla = df_parla.with_columns(
+        wahlperiode=wahlperiode(pl.col("date")), year=pl.col("date").dt.year()
+    )
+
+    for (term, year), df_part in df_parla.partition_by(
+        "wahlperiode", "year", as_dict=True
+    ).items():
+        part_path = tmp_path / f"wahlperiode={term}" / f"year={year}"
+        part_path.mkdir(parents=True)
+        df_part.drop("wahlperiode", "year").sort("abbreviation", "date").write_parquet(
+            part_path / "part-0.parquet",
+            statistics=True,
+            row_group_size=row_group_size,
+        )
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.replace(path)
+
+
+def _partition(file: Path, key: str) -> int:
+    """Value of a key=value folder of the path of a partition file"""
+    folder = next(p for p in file.parents if p.name.startswith(f"{key}="))
+    return int(folder.name.split("=", 1)[1])
+
+
+def scan_corpus(
+    path: Path = CORPUS_PATH,
+    columns: Sequence[str] | None = None,
+    start: date | str | None = None,
+    end: date | str | None = None,
+    parties: Sequence[str] | None = None,
+) -> pl.LazyFrame:
+    """Lazily scans the partitioned corpus. The files are memory mapped and only the
+    requested columns, the partitions of the requested years and the row groups whose
+    statistics can match are read, e.g. all AfD speeches of 2023:
+
+        scan_corpus(start="2023-01-01", end="2023-12-31", parties=["AfD"]).collect()
+
+    Args:
+        path (Path): Root folder of the store
+        columns (Sequence[str] | None): Columns to read, None for all
+        start (date | str | None): First date, strings as %Y-%m-%d
+        end (date | str | None): Last date, strings as %Y-%m-%d
+        parties (Sequence[str] | None): Abbreviations of the parties to read
+
+    Returns:
+        pl.LazyFrame: The speeches with the additional columns wahlperiode and year
+    """
+    start = date.fromisoformat(start) if isinstance(start, str) else start
+    end = date.fromisoformat(end) if isinstance(end, str) else end
+
+    # Partitions outside the years are skipped by not scanning their files. wahlperiode and
+    # year are added per file instead of by hive_partitioning, whose columns polars 1.22
+    # returns with the wrong length once rows are filtered.
+    files = sorted(Path(path).glob("wahlperiode=*/year=*/*.parquet"))
+    in_range = [
+        f
+        for f in files
+        if (start is None or _partition(f, "year") >= start.year)
+        and (end is None or _partition(f, "year") <= end.year)
+    ]
+    df_parla = pl.concat(
+        [
+            pl.scan_parquet(f, hive_partitioning=False).with_columns(
+                wahlperiode=pl.lit(_partition(f, "wahlperiode"), dtype=pl.Int64),
+                year=pl.lit(_partition(f, "year"), dtype=pl.Int32),
+            )
+            for f in in_range or files[:1]
+        ]
+    )
+    if not in_range:
+        df_parla = df_parla.clear()
+
+    # The date lets polars skip the row groups inside of the partitions
+    if start is not None:
+        df_parla = df_parla.filter(pl.col("date") >= start)
+    if end is not None:
+        df_parla = df_parla.filter(pl.col("date") <= end)
+    if parties is not None:
+        df_parla = df_parla.filter(pl.col("abbreviation").is_in(parties))
+    if columns is not None:
+        df_parla = df_parla.select(columns)
+
+    return df_parla
+
+
+def read_corpus(
+    path: Path = CORPUS_PATH,
+    columns: Sequence[str] | None = None,
+    start: date | str | None = None,
+    end: date | str | None = None,
+    parties: Sequence[str] | None = None,
+) -> pl.DataFrame:
+    """Reads a slice of the partitioned corpus, see scan_corpus"""
+    return scan_corpus(path, columns, start, end, parties).collect()
@@ -1,78 +1,171 @@
-import urllib.request
-import json
-from datetime import datetime
+import asyncio
+from datetime import datetime, timezone
 from tqdm import tqdm
 import re
 from config import settings
 from pathlib import Path
+from typing import AsyncIterator, Callable
+from ParlaMind.src import AsyncDownloader
+from ParlaMind.src.SyncManifest import SyncManifest, file_sha256
 
 # Retrieve from https://dip.bundestag.de/%C3%BCber-dip/hilfe/api
 API_KEY = settings.api_key
+API_URL = settings.get("dip_api_url", "https://search.dip.bundestag.de/api/v1")
+
+
+async def iter_documents(
+    downloader: AsyncDownloader.AsyncDownloader,
+    resource: str,
+    params: dict,
+    on_total: Callable[[int], None] | None = None,
+) -> AsyncIterator[dict]:
+    """Yields the metadata of every document of a DIP listing as the pages arrive.
+    The API returns at most 100 documents per page together with a cursor for the
+    next page, the listing is done once the cursor stops changing.
+
+    Args:
+        downloader (AsyncDownloader): Open downloader used for the requests
+        resource (str): API resource, e.g. "plenarprotokoll"
+        params (dict): Filter parameters, e.g. {"f.zuordnung": "BT"}
+        on_total (Callable[[int], None] | None): Called with numFound of the first page
+
+    Yields:
+        dict: One document of the listing
+    """
+    url = f"{API_URL}/{resource}"
+    params = {**params, "apikey": API_KEY}
+    cursor = None
+
+    while True:
+        page = await downloader.get_json(
+            url, params if cursor is None else {**params, "cursor": cursor}
+        )
+
+        if cursor is None and on_total is not None:
+            on_total(page["numFound"])
+
+        for document in page["documents"]:
+            yield document
+
+        if not page["documents"] or page.get("cursor") in (None, cursor):
+            break
+        cursor = page["cursor"]
+
+
+def download_data(format: str, start_year: int, verify: bool = False) -> None:
+    """Downloads the plenarprotokolle via the API
+
+    Args:
+        format (str): XML or PDF
+        start_year (int): First year to download
+        verify (bool): Compare the sha256 of every downloaded file, not only of files modified since their download
+    """
+
+    format = format.upper()
+    if format not in ("XML", "PDF"):
+        raise ValueError(f"Unknown format {format}, expected XML or PDF")
+
+    asyncio.run(_download_data(format, start_year, verify))
+
+
+async def _download_data(format: str, start_year: int, verify: bool = False) -> None:
+    started_at = datetime.now(timezone.utc)
+    folder = Path(f"./data/raw/{format}/")
+    manifest = SyncManifest(folder / "manifest.json")
+
+    params = {
+        "f.zuordnung": "BT",
+        "f.datum.start": f"{start_year}-01-01",
+        "f.datum.end": f"{datetime.today().year}-12-31",
+    }
+    # The listing only has changed documents, files damaged since their download are
+    # checked on their own. Hashing reads the files, so it runs off the event loop.
+    damaged = await asyncio.to_thread(manifest.damaged_documents, folder, verify)
+    # Entries of older manifests have no url, only a full listing downloads them again
+    unknown_url = [i for i in damaged if manifest.documents[i].get("url") is None]
+    for document_id in unknown_url:
+        del manifest.documents[document_id]
+    damaged = [i for i in damaged if i not in unknown_url]
+
+    changed_since = manifest.changed_since(params["f.datum.start"])
+    if changed_since is not None and not unknown_url:
+        params["f.aktualisiert.start"] = changed_since
+
+    failed = False
+
+    async with AsyncDownloader.AsyncDownloader(
+        max_connections=settings.get("download_max_connections", 8),
+        rate_limit=settings.get("download_rate_limit", None),
+    ) as downloader:
+
+        with tqdm() as pbar:
+
+            def set_total(total):
+                pbar.total = total
+                pbar.refresh()
+
+            async def download(url, file_name, document):
+                nonlocal failed
+                size, error = await downloader.try_fetch(url, file_name)
+                if error is None:
+                    sha256 = await asyncio.to_thread(file_sha256, file_name)
+                    manifest.record(document, url, file_name, size, sha256)
+                    # Files of older runs were only named by date
+                    (folder / f"speech-{document['datum']}.{format.lower()}").unlink(missing_ok=True)
+                else:
+                    failed = True
+                    print(f"Skipped data from {document['datum']}")
+                pbar.update(1)
 
-
-def download_data(format: str, start_year: int) -> None:
-    """Downloads the plenarprotokolle via the API"""
-
-    documents_per_json = 100  # limit from api
-
-    today = datetime.today()
-    current_year = today.year
-
-    url = f"https://search.dip.bundestag.de/api/v1/plenarprotokoll?f.zuordnung=BT&f.datum.start={start_year}-01-01&f.datum.end={current_year}-12-31&apikey={API_KEY}"
-
-    urllib.request.urlretrieve(url, "reden.json")
-
-    with open("reden.json") as f:
-        d = json.load(f)
-
-    total_documents = d["numFound"]
-
-    years_since_founding = current_year - start_year
-
-    with tqdm(total=total_documents) as pbar:
-
-        for i in range(years_since_founding + 1):
-            url = f"https://search.dip.bundestag.de/api/v1/plenarprotokoll?f.zuordnung=BT&f.datum.start={start_year+i}-01-01&f.datum.end={start_year+i}-12-31&apikey={API_KEY}"
-
-            urllib.request.urlretrieve(url, "reden.json")
-
-            with open("reden.json") as f:
-                d = json.load(f)
-
-            for i in range(documents_per_json):
-                try:
-                    document = d["documents"][i]["fundstelle"]
-                except IndexError:
-                    break
-                date = document["datum"]
-                try:
-                    url_pdf = document["pdf_url"]
-                    url_xml = re.sub(".pdf", ".xml", url_pdf)
-                except KeyError:
-                    print(f"Skipped data from {date}")
-                    pbar.update(1)
-                    break
-                try:
-                    if format.upper() == "XML":
-                        file_name = f"./data/raw/XML/speech-{date}.xml"
-                        Path("./data/raw/XML/").mkdir(parents=True, exist_ok=True)
-
-                        my_file = Path(file_name)
-                        if my_file.is_file():
-                            pbar.update(1)
-                            continue
-
-                        urllib.request.urlretrieve(url_xml, file_name)
-                    elif format.upper() == "PDF":
-                        file_name = f"./data/raw/PDF/speech-{date}.pdf"
-                        Path("./data/raw/PDF/").mkdir(parents=True, exist_ok=True)
-
-                        my_file = Path(file_name)
-                        if my_file.is_file():
-                            pbar.update(1)
-                            continue
-
-                        urllib.request.urlretrieve(url_pdf, file_name)
-                except urllib.error.HTTPError:
-                    print(f"Skipped data from {date}")
+            async def repair(document_id):
+                nonlocal failed
+                entry = manifest.documents[document_id]
+                file_name = folder / entry["file"]
+                size, error = await downloader.try_fetch(entry["url"], file_name)
+                if error is None:
+                    sha256 = await asyncio.to_thread(file_sha256, file_name)
+                    manifest.record_file(document_id, file_name, size, sha256)
+                else:
+                    failed = True
+                    print(f"Skipped data from {entry['datum']}")
                 pbar.update(1)
+
+            # Downloads start while later pages of the listing are still being requested
+            tasks = []
+            unlisted = set(damaged)
+
+            try:
+                async for document in iter_documents(
+                    downloader, "plenarprotokoll", params, set_total
+                ):
+                    unlisted.discard(str(document["id"]))
+
+                    url_pdf = document["fundstelle"].get("pdf_url")
+                    if url_pdf is None:
+                        print(f"Skipped data from {document['datum']}")
+                        pbar.update(1)
+                        continue
+
+                    url = re.sub(r"\.pdf$", ".xml", url_pdf) if format == "XML" else url_pdf
+                    # The id keeps two sessions on the same day apart
+                    file_name = folder / f"speech-{document['datum']}-{document['id']}.{format.lower()}"
+
+                    if str(document["id"]) not in damaged and not manifest.needs_download(
+                        document, file_name
+                    ):
+                        pbar.update(1)
+                        continue
+
+                    tasks.append(asyncio.create_task(download(url, file_name, document)))
+
+                # Damaged files of unchanged documents, listed ones are downloaded above
+                repairs = [i for i in damaged if i in unlisted]
+                set_total((pbar.total or 0) + len(repairs))
+                tasks.extend(asyncio.create_task(repair(i)) for i in repairs)
+                await asyncio.gather(*tasks)
+            finally:
+                manifest.save()
+
+    if not failed:
+        manifest.mark_synced(started_at, params["f.datum.start"])
+        manifest.save()
@@ -0,0 +1,143 @@
+import zlib
+
+import numpy as np
+import polars as pl
+
+# Mersenne prime for the MinHash permutations, small enough that a * crc32 fits into uint64
+_PRIME = (1 << 31) - 1
+
+# OpenDiscourse replaces interjections in the speech text by ({n})
+INTERJECTION_MARKER = r"\(\{\d+\}\)"
+
+
+def normalize_text(expr: pl.Expr) -> pl.Expr:
+    """Lowercases a text and reduces it to its words separated by single spaces. Drops the
+    ({n}) interjection markers of OpenDiscourse, so the same speech from OpenDiscourse and
+    the XML protocols normalizes to the same string."""
+    return (
+        expr.fill_null("")
+        .str.to_lowercase()
+        .str.replace_all(INTERJECTION_MARKER, " ")
+        .str.replace_all(r"[^\w]+", " ")
+        .str.strip_chars()
+    )
+
+
+def _normalize_name(expr: pl.Expr) -> pl.Expr:
+    return expr.fill_null("").str.to_lowercase().str.replace_all(r"\s+", " ").str.strip_chars()
+
+
+def _minhash(texts: list[str], num_perm: int, shingle_size: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        words = text.split()
+        shingles = {
+            " ".join(words[j : j + shingle_size])
+            for j in range(max(1, len(words) - shingle_size + 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        signatures[i] = ((np.outer(hashes, a) + b) % _PRIME).min(axis=0)
+
+    return signatures
+
+
+def _near_duplicates(
+    df: pl.DataFrame, threshold: float, num_perm: int, shingle_size: int
+) -> pl.Series:
+    """Marks rows whose estimated Jaccard similarity to an earlier row of the same date and
+    speaker reaches threshold. Date and speaker act as the LSH buckets: only speeches within
+    one of these small blocks are ever compared."""
+    candidates = (
+        df.with_row_index("_row")
+        .filter(pl.len().over("date", "_first", "_last") > 1)
+        .select(
+            "_row",
+            _text=normalize_text(pl.col("speechContent")),
+            block=pl.struct("date", "_first", "_last").hash(),
+        )
+        # Rows of a block are adjacent and keep their order, so each block is one slice
+        .sort("block", "_row")
+    )
+
+    duplicate = np.zeros(df.height, dtype=bool)
+    if candidates.is_empty():
+        return pl.Series(duplicate)
+
+    signatures = _minhash(candidates["_text"].to_list(), num_perm, shingle_size)
+    rows = candidates["_row"].to_numpy()
+    _, starts, sizes = np.unique(
+        candidates["block"].to_numpy(), return_index=True, return_counts=True
+    )
+
+    for start, size in zip(starts, sizes):
+        members = np.arange(start, start + size)
+        sig = signatures[members]
+        similarity = (sig[:, None, :] == sig[None, :, :]).mean(axis=2)
+
+        kept = []
+        for i in range(len(members)):
+            if any(similarity[i, j] >= threshold for j in kept):
+                duplicate[rows[members[i]]] = True
+            else:
+                kept.append(i)
+
+    return pl.Series(duplicate)
+
+
+def deduplicate(
+    df: pl.DataFrame,
+    near_duplicates: bool = False,
+    threshold: float = 0.9,
+    num_perm: int = 64,
+    shingle_size: int = 3,
+) -> tuple[pl.DataFrame, dict[str, int]]:
+    """Drops speeches that occur more than once, keeping the first occurrence.
+
+    Every speech gets a 64 bit fingerprint of its date, speaker and normalized text (see
+    normalize_text), so copies that only differ in whitespace, punctuation, interjection
+    markers or party attribution are found as well. Optionally speeches of the same date
+    and speaker are compared by MinHash to also catch near duplicates.
+
+    Args:
+        df (pl.DataFrame): Speeches with the columns date, firstName, lastName and speechContent
+        near_duplicates (bool): Also drop near duplicates
+        threshold (float): Estimated Jaccard similarity of word shingles from which on two speeches are near duplicates
+        num_perm (int): Number of MinHash permutations
+        shingle_size (int): Number of words per shingle
+
+    Returns:
+        tuple[pl.DataFrame, dict[str, int]]: The speeches without duplicates and the number of
+        dropped rows per reason: "exact" for identical rows, "normalized" for identical
+        fingerprints and "near" for near duplicates
+    """
+    columns = df.columns
+    df = df.with_columns(
+        _first=_normalize_name(pl.col("firstName")),
+        _last=_normalize_name(pl.col("lastName")),
+    ).with_columns(
+        _exact=pl.struct(columns).hash(),
+        # The normalized text is only hashed, never kept as a second copy of the speeches
+        _fingerprint=pl.struct(
+            "date", "_first", "_last", normalize_text(pl.col("speechContent")).alias("_text")
+        ).hash(),
+    )
+
+    unique_rows = df["_exact"].n_unique()
+    dropped = {"exact": df.height - unique_rows}
+
+    df = df.filter(pl.col("_fingerprint").is_first_distinct())
+    dropped["normalized"] = unique_rows - df.height
+    dropped["near"] = 0
+
+    if near_duplicates:
+        duplicate = _near_duplicates(df, threshold, num_perm, shingle_size)
+        dropped["near"] = int(duplicate.sum())
+        df = df.filter(~duplicate)
+
+    return df.drop("_first", "_last", "_exact", "_fingerprint"), dropped
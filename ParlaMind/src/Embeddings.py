@@ -0,0 +1,323 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import torch
+from sentence_transformers import SentenceTransformer
+from sklearn.cluster import MiniBatchKMeans
+from tqdm import tqdm
+
+from ParlaMind.src import CorpusStore
+
+STORE_PATH = Path("./data/features/embeddings")
+# Default model of BERTopic for languages other than English
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+# Number of rows copied or assigned at once
+_BLOCK_SIZE = 65_536
+
+# Model of the current process, loaded once by _load_model
+_model = None
+_model_name = None
+
+
+def _load_model(model_name: str, threads: int | None) -> SentenceTransformer:
+    global _model, _model_name
+    torch.set_num_threads(threads or os.cpu_count() or 1)
+    if _model_name != model_name:
+        _model = SentenceTransformer(model_name, device="cpu")
+        _model_name = model_name
+    return _model
+
+
+def embed(
+    texts: list[str],
+    model_name: str = MODEL_NAME,
+    batch_size: int = 32,
+    threads: int | None = None,
+) -> np.ndarray:
+    """Embeds texts with a sentence-transformers model. Embeddings have unit length, so
+    the dot product of two is their cosine similarity.
+
+    Args:
+        texts (list[str]): The texts, longer ones are truncated to the max_seq_length of the model
+        model_name (str): Name or folder of the sentence-transformers model
+        batch_size (int): Number of texts per batch
+        threads (int | None): Number of torch threads, None for one per CPU
+
+    Returns:
+        np.ndarray: One float32 row per text
+    """
+    model = _load_model(model_name, threads)
+    return model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+
+
+def _read_meta(path: Path) -> dict | None:
+    meta_path = Path(path) / "store.json"
+    if not meta_path.is_file():
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_embeddings(path: Path) -> np.ndarray:
+    return np.load(Path(path) / "embeddings.npy", mmap_mode="r")
+
+
+def load_store(path: Path = STORE_PATH) -> tuple[np.ndarray, pl.DataFrame]:
+    """Opens a store written by build_store. The embeddings are memory mapped, so only
+    the rows used are read from disk.
+
+    Args:
+        path (Path): Folder of the store
+
+    Returns:
+        tuple[np.ndarray, pl.DataFrame]: The float16 embeddings and their rows, with all
+        columns of the texts except the embedded one plus speechHash
+    """
+    return _load_embeddings(path), pl.read_parquet(Path(path) / "rows.parquet")
+
+
+def build_store(
+    df_parla: pl.DataFrame,
+    path: Path = STORE_PATH,
+    model_name: str = MODEL_NAME,
+    column: str = "speechContent",
+    chunk_size: int = 10_000,
+    batch_size: int = 32,
+    threads: int | None = None,
+) -> Path:
+    """Embeds every text and stores the embeddings as a float16 matrix with one row per
+    row of df_parla, in the same order.
+
+    Texts already in the previous store of the same model are copied instead of embedded
+    again, so rebuilding the store of an updated corpus only embeds new speeches. Texts
+    occurring more than once are embedded once. The index of the previous store is
+    removed, see build_index.
+
+    Args:
+        df_parla (pl.DataFrame): Speeches, or sentences of SentenceSplitter.explode_sentences
+        path (Path): Folder of the store, see load_store
+        model_name (str): Name or folder of the sentence-transformers model
+        column (str): Column with the texts, rows where it is null are left out
+        chunk_size (int): Number of texts embedded before they are written to disk
+        batch_size (int): Number of texts per batch
+        threads (int | None): Number of torch threads, None for one per CPU
+
+    Returns:
+        Path: The folder of the store
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    df_rows = df_parla.filter(pl.col(column).is_not_null())
+    df_rows = df_rows.with_columns(CorpusStore.speech_hash(df_rows[column]))
+
+    old_embeddings = None
+    df_known = pl.DataFrame(schema={"speechHash": pl.UInt64, "oldRow": pl.UInt32})
+    meta = _read_meta(path)
+    if meta is not None and meta["model_name"] == model_name:
+        old_embeddings, df_old = load_store(path)
+        df_known = (
+            df_old.select("speechHash")
+            .with_row_index("oldRow")
+            .unique("speechHash", keep="first")
+        )
+
+    df_plan = (
+        df_rows.select("speechHash", column)
+        .with_row_index("row")
+        .join(df_known, on="speechHash", how="left")
+        .with_columns(firstRow=pl.col("row").first().over("speechHash"))
+    )
+
+    model = _load_model(model_name, threads)
+    dimension = model.get_sentence_embedding_dimension()
+    embeddings = np.lib.format.open_memmap(
+        tmp_path / "embeddings.npy", mode="w+", dtype=np.float16, shape=(df_rows.height, dimension)
+    )
+
+    df_copy = df_plan.filter(pl.col("oldRow").is_not_null())
+    for start in range(0, df_copy.height, _BLOCK_SIZE):
+        df_block = df_copy.slice(start, _BLOCK_SIZE)
+        embeddings[df_block["row"].to_numpy()] = old_embeddings[df_block["oldRow"].to_numpy()]
+
+    df_new = df_plan.filter(pl.col("oldRow").is_null(), pl.col("row") == pl.col("firstRow"))
+    for start in tqdm(range(0, df_new.height, chunk_size), desc="Embedding texts"):
+        df_chunk = df_new.slice(start, chunk_size)
+        embeddings[df_chunk["row"].to_numpy()] = embed(
+            df_chunk[column].to_list(), model_name, batch_size, threads
+        )
+
+    df_repeated = df_plan.filter(pl.col("oldRow").is_null(), pl.col("row") != pl.col("firstRow"))
+    embeddings[df_repeated["row"].to_numpy()] = embeddings[df_repeated["firstRow"].to_numpy()]
+
+    embeddings.flush()
+    del embeddings, old_embeddings
+
+    df_rows.drop(column).write_parquet(tmp_path / "rows.parquet")
+    with open(tmp_path / "store.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "model_name": model_name,
+                "column": column,
+                "shape": [df_rows.height, dimension],
+            },
+            f,
+            indent=1,
+        )
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.replace(path)
+    return path
+
+
+def build_index(
+    path: Path = STORE_PATH,
+    n_lists: int | None = None,
+    sample_size: int = 100_000,
+    seed: int = 0,
+) -> Path:
+    """Builds an inverted file (IVF) index of a store for approximate nearest neighbour
+    search. The embeddings are clustered by k-means on a sample, every row is assigned to
+    its nearest centroid and searches only compare the rows of the closest clusters.
+    The clusters double as a coarse topic clustering of the whole corpus, see load_index.
+
+    Args:
+        path (Path): Folder of the store, the index is written to its subfolder index
+        n_lists (int | None): Number of clusters, None for the square root of the number of rows
+        sample_size (int): Number of rows the centroids are fitted on
+        seed (int): Seed of the sample and k-means
+
+    Returns:
+        Path: The folder of the index
+    """
+    embeddings = _load_embeddings(path)
+    if len(embeddings) == 0:
+        raise ValueError(f"The store {path} is empty")
+
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(embeddings), min(sample_size, len(embeddings)), replace=False))
+    n_lists = min(n_lists or int(np.sqrt(len(embeddings))) or 1, len(sample))
+
+    kmeans = MiniBatchKMeans(n_lists, random_state=seed, n_init=3).fit(
+        embeddings[sample].astype(np.float32)
+    )
+    centroids = kmeans.cluster_centers_.astype(np.float32)
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+    lists = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), _BLOCK_SIZE):
+        block = embeddings[start : start + _BLOCK_SIZE].astype(np.float32)
+        lists[start : start + _BLOCK_SIZE] = (block @ centroids.T).argmax(axis=1)
+
+    index_path = Path(path) / "index"
+    shutil.rmtree(index_path, ignore_errors=True)
+    index_path.mkdir()
+    np.save(index_path / "centroids.npy", centroids)
+    np.save(index_path / "lists.npy", lists)
+    # Rows ordered by cluster, the rows of cluster i are order[offsets[i] : offsets[i + 1]]
+    np.save(index_path / "order.npy", np.argsort(lists, kind="stable"))
+    np.save(
+        index_path / "offsets.npy",
+        np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=n_lists))]),
+    )
+    return index_path
+
+
+def load_index(path: Path = STORE_PATH) -> dict[str, np.ndarray]:
+    """Opens the index of a store written by build_index
+
+    Args:
+        path (Path): Folder of the store
+
+    Returns:
+        dict[str, np.ndarray]: centroids, lists as the cluster of every row, order and offsets
+    """
+    index_path = Path(path) / "index"
+    return {
+        name: np.load(index_path / f"{name}.npy", mmap_mode="r")
+        for name in ("centroids", "lists", "order", "offsets")
+    }
+
+
+def search(
+    queries: np.ndarray,
+    path: Path = STORE_PATH,
+    k: int = 10,
+    n_probe: int = 8,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the approximately k most similar rows of the store for every query
+
+    Args:
+        queries (np.ndarray): Embeddings of unit length as returned by embed, one per row
+        path (Path): Folder of the store with an index, see build_index
+        k (int): Number of rows per query
+        n_probe (int): Number of clusters searched per query, more are slower but more exact
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Rows and cosine similarities, both of shape
+        (queries, k) and ordered by similarity. Missing rows are -1 with similarity nan.
+    """
+    embeddings = _load_embeddings(path)
+    index = load_index(path)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+
+    rows = np.full((len(queries), k), -1, dtype=np.int64)
+    similarities = np.full((len(queries), k), np.nan, dtype=np.float32)
+    n_probe = min(n_probe, len(index["centroids"]))
+    probes = np.argsort(-(queries @ index["centroids"].T), axis=1)[:, :n_probe]
+
+    offsets = index["offsets"]
+    for i, (query, lists) in enumerate(zip(queries, probes)):
+        candidates = np.sort(
+            np.concatenate([index["order"][offsets[j] : offsets[j + 1]] for j in lists])
+        )
+        scores = embeddings[candidates].astype(np.float32) @ query
+        top = np.argsort(-scores, kind="stable")[:k]
+        rows[i, : len(top)] = candidates[top]
+        similarities[i, : len(top)] = scores[top]
+    return rows, similarities
+
+
+def similar_speeches(
+    row: int,
+    path: Path = STORE_PATH,
+    k: int = 10,
+    n_probe: int = 8,
+) -> pl.DataFrame:
+    """Finds the speeches most similar to a speech of the store
+
+    Args:
+        row (int): Row of the speech in the store
+        path (Path): Folder of the store with an index, see build_index
+        k (int): Number of similar speeches
+        n_probe (int): Number of clusters searched, see search
+
+    Returns:
+        pl.DataFrame: The rows of the similar speeches, see load_store, with their row in
+        the store and the cosine similarity, most similar first
+    """
+    rows, similarities = search(_load_embeddings(path)[row], path, k + 1, n_probe)
+    found = (rows[0] >= 0) & (rows[0] != row)
+    rows, similarities = rows[0][found][:k], similarities[0][found][:k]
+    return (
+        pl.read_parquet(Path(path) / "rows.parquet")
+        .with_row_index("row")
+        .join(
+            pl.DataFrame({"row": rows, "similarity": similarities}, schema_overrides={"row": pl.UInt32}),
+            on="row",
+        )
+        .sort("similarity", descending=True)
+    )
@@ -1,323 +1,227 @@
 import polars as pl
-import pandas as pd
-from ParlaMind.src import FileReader
+from ParlaMind.src import CorpusStore, Deduplicator, ShardCache, SpeakerRegistry
 from pathlib import Path
+from typing import Callable, Sequence
+import logging
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+OPEN_DISCOURSE_PATH = Path("./data/raw/OpenDiscourse")
+OPEN_DISCOURSE_CACHE = Path("./data/cache/open_discourse")
+
+# Types of the OpenDiscourse columns we use, everything else is inferred
+SPEECHES_SCHEMA = {
+    "firstName": pl.String,
+    "lastName": pl.String,
+    "speechContent": pl.String,
+    "date": pl.String,
+    "factionId": pl.Int64,
+    "politicianId": pl.Int64,
+}
+FACTIONS_SCHEMA = {"id": pl.Int64, "abbreviation": pl.String, "full_name": pl.String}
+
+# Cleaned XML faction names (see __clean_party) to the abbreviations of OpenDiscourse
+PARTY_TRANSLATION = {
+    "AFD": "AfD",
+    "BSW": "BSW",  # No clear equivalent
+    "BÜNDNIS\xa090/DIEGRÜNEN": "Grüne",
+    "CDU/CSU": "CDU/CSU",
+    "DIELINKE": "DIE LINKE.",
+    "FDP": "FDP",
+    "FRAKTIONSLOS": "Fraktionslos",
+    "SPD": "SPD",
+    "SPDCDU/CSU": "CDU/CSU",  # Alexander Föhr, see xml_speeches
+}
+
+
+def __clean_party(expr: pl.Expr) -> pl.Expr:
+    return expr.str.replace_all(r"[ \n\t]", "").str.to_uppercase()
+
+
+# Cleaning steps for the speech text by name, applied in the order given to clean_speeches
+CLEANING_STEPS: dict[str, Callable[[pl.Expr], pl.Expr]] = {
+    "soft_hyphens": lambda s: s.str.replace_all("\u00ad", "", literal=True),
+    "interjections": lambda s: s.str.replace_all(Deduplicator.INTERJECTION_MARKER, ""),
+    "whitespace": lambda s: s.str.replace_all(r"\s+", " "),
+    "strip": lambda s: s.str.strip_chars(),
+}
+
+
+def clean_speeches(
+    df_parla: pl.DataFrame,
+    steps: Sequence[str] = tuple(CLEANING_STEPS),
+    min_length: int = 40,
+) -> tuple[pl.DataFrame, dict[str, float]]:
+    """Cleans speechContent with native polars string expressions and drops short speeches
+
+    Args:
+        df_parla (pl.DataFrame): Speeches
+        steps (Sequence[str]): Names of the CLEANING_STEPS to run, in order
+        min_length (int): Speeches with fewer characters after cleaning are dropped, 0 keeps all
+
+    Returns:
+        tuple[pl.DataFrame, dict[str, float]]: The cleaned speeches and the seconds every step took
+    """
+    timings = {}
+
+    for step in steps:
+        start = time.perf_counter()
+        df_parla = df_parla.with_columns(CLEANING_STEPS[step](pl.col("speechContent")))
+        timings[step] = time.perf_counter() - start
+
+    if min_length:
+        start = time.perf_counter()
+        df_parla = df_parla.filter(pl.col("speechContent").str.len_chars() >= min_length)
+        timings["min_length"] = time.perf_counter() - start
+
+    return df_parla, timings
+
+
+def cache_open_discourse(batch_size: int = 100_000) -> None:
+    """Converts speeches.csv once into Parquet parts in OPEN_DISCOURSE_CACHE, which
+    scan_open_discourse prefers over the CSV. The CSV is read in batches, so this
+    needs far less memory than loading it.
+
+    Args:
+        batch_size (int): Rows per batch and therefore per part
+    """
+    tmp_path = OPEN_DISCOURSE_CACHE.with_name(OPEN_DISCOURSE_CACHE.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    reader = pl.read_csv_batched(
+        OPEN_DISCOURSE_PATH / "speeches.csv",
+        schema_overrides=SPEECHES_SCHEMA,
+        infer_schema_length=10_000,
+        batch_size=batch_size,
+    )
+
+    part = 0
+    while batches := reader.next_batches(1):
+        batches[0].write_parquet(tmp_path / f"part-{part:05d}.parquet")
+        part += 1
+
+    shutil.rmtree(OPEN_DISCOURSE_CACHE, ignore_errors=True)
+    tmp_path.replace(OPEN_DISCOURSE_CACHE)
 
 
-def __clean_string(el):
-    if el is None:
-        return None
-    return el.replace(" ", "").replace("\n", "").replace("\t", "").upper()
+def __scan_speeches() -> pl.LazyFrame:
+    csv_path = OPEN_DISCOURSE_PATH / "speeches.csv"
 
+    if (
+        OPEN_DISCOURSE_CACHE.is_dir()
+        and OPEN_DISCOURSE_CACHE.stat().st_mtime >= csv_path.stat().st_mtime
+    ):
+        return pl.scan_parquet(OPEN_DISCOURSE_CACHE / "*.parquet")
 
-def __clean_df(df_parla: pl.DataFrame) -> pl.DataFrame:
-    df_parla = df_parla.with_columns(
-        pl.col("speechContent")
-        .map_elements(lambda x: x.strip(), return_dtype=pl.String)
-        .alias("speechContent"),
+    return pl.scan_csv(
+        csv_path, schema_overrides=SPEECHES_SCHEMA, infer_schema_length=10_000
     )
 
-    return df_parla.filter(df_parla["speechContent"].str.len_chars() >= 40)
 
+def scan_open_discourse() -> pl.LazyFrame:
+    """Lazily joins the OpenDiscourse speeches with their factions. Only the needed
+    columns are read and speeches without faction are dropped while scanning.
+    Reads the Parquet cache of cache_open_discourse if it is newer than the CSV.
 
-def get_open_discourse() -> pl.DataFrame:
-    df_speeches = pl.read_csv("./data/raw/OpenDiscourse/speeches.csv")
-    df_factions = pl.read_csv("./data/raw/OpenDiscourse/factions.csv")
+    Returns:
+        pl.LazyFrame: Columns firstName, lastName, speechContent, date, abbreviation, full_name and speakerId
+    """
+    df_factions = pl.scan_csv(
+        OPEN_DISCOURSE_PATH / "factions.csv", schema_overrides=FACTIONS_SCHEMA
+    ).filter(pl.col("abbreviation") != "not found")
 
-    df_parla = df_speeches.join(
+    df_parla = __scan_speeches().join(
         df_factions, left_on="factionId", right_on="id", how="inner"
     )
 
-    df_parla = df_parla.filter(pl.col("abbreviation") != "not found")
-
     return df_parla.select(
-        "firstName", "lastName", "speechContent", "date", "abbreviation", "full_name"
+        "firstName",
+        "lastName",
+        "speechContent",
+        pl.col("date").str.slice(0, 10).str.to_date("%Y-%m-%d"),
+        "abbreviation",
+        "full_name",
+        # OpenDiscourse uses the MdB id of the Bundestag master data, -1 if it is unknown
+        speakerId=pl.when(pl.col("politicianId") >= 0).then(
+            pl.col("politicianId").cast(pl.String)
+        ),
     )
 
 
-def concat_od_with_xml(df_parla: pl.dataframe, save: bool) -> pl.DataFrame:
-
-    df_xml = FileReader.put_all_xmls_into_one_df("./data/raw/XML")
-    df_xml = df_xml.drop(["WahlperiodenNr", "SitzungsNr", "Titel", "Kommentare"])
-
-    df_xml_pd = df_xml.to_pandas()
-
-    df_temp = df_xml_pd.loc[df_xml_pd["Fraktion"] == "SPDCDU/CSU"]
-    df_temp["Vorname"] = "Alexander"
-    df_temp["Nachname"] = "Föhr"
-    df_temp["Fraktion"] = "CDU/CSU"
+def get_open_discourse() -> pl.DataFrame:
+    return scan_open_discourse().collect(streaming=True)
 
-    df_xml_pd = df_xml_pd.loc[df_xml_pd["Fraktion"] != "SPDCDU/CSU"]
 
-    df_parla_partys = set(list(df_parla["abbreviation"].value_counts()["abbreviation"]))
-    df_xml_partys = set(list(df_xml_pd["Fraktion"].apply(lambda s: __clean_string(s))))
+def xml_speeches(df_xml: pl.LazyFrame) -> pl.LazyFrame:
+    """Brings parsed protocols into the OpenDiscourse layout
 
-    party_translation = {
-        "AFD": "AfD",
-        "BSW": "BSW",  # No clear equivalent
-        "BÜNDNIS\xa090/DIEGRÜNEN": "Grüne",
-        "CDU/CSU": "CDU/CSU",
-        "DIELINKE": "DIE LINKE.",
-        "FDP": "FDP",
-        "FRAKTIONSLOS": "Fraktionslos",
-        None: None,  # Represents missing or unspecified data
-        "SPD": "SPD",
-    }
+    Args:
+        df_xml (pl.LazyFrame): Speeches as returned by ShardCache.scan_xml_shards
 
-    df_xml_pd["Fraktion"] = df_xml_pd["Fraktion"].apply(lambda s: __clean_string(s))
-    df_xml_pd["Fraktion"] = df_xml_pd["Fraktion"].apply(lambda s: party_translation[s])
+    Returns:
+        pl.LazyFrame: Columns abbreviation, date, firstName, lastName, speakerId and speechContent
+    """
+    # The XML attributes the speeches of Alexander Föhr to a faction "SPDCDU/CSU" without a name
+    foehr = pl.col("Fraktion") == "SPDCDU/CSU"
 
-    df_temp["Datum"] = pd.to_datetime(df_temp["Datum"], format="%d.%m.%Y").dt.strftime(
-        "%Y-%m-%d"
+    return df_xml.select(
+        __clean_party(pl.col("Fraktion")).replace_strict(PARTY_TRANSLATION).alias("abbreviation"),
+        pl.col("Datum").str.strptime(pl.Date, "%d.%m.%Y").alias("date"),
+        pl.when(foehr).then(pl.lit("Alexander")).otherwise(pl.col("Vorname")).alias("firstName"),
+        pl.when(foehr).then(pl.lit("Föhr")).otherwise(pl.col("Nachname")).alias("lastName"),
+        pl.col("RednerId").alias("speakerId"),
+        pl.col("Rede").alias("speechContent"),
     )
 
-    df_xml_pd["Datum"] = pd.to_datetime(
-        df_xml_pd["Datum"], format="%d.%m.%Y"
-    ).dt.strftime("%Y-%m-%d")
 
-    df_xml_pd = pd.concat([df_xml_pd, df_temp])
-    df_xml = pl.from_pandas(df_xml_pd)
+def concat_od_with_xml(
+    df_parla: pl.DataFrame | pl.LazyFrame, save: bool, near_duplicates: bool = False
+) -> pl.DataFrame:
+    """Merges OpenDiscourse with the downloaded protocols. Speeches contained in both
+    are dropped by Deduplicator.deduplicate, everything else runs as lazy queries.
 
-    try:
-        df_xml = df_xml.drop(["__index_level_0__"])
-    except:
-        pass
+    Args:
+        df_parla (pl.DataFrame | pl.LazyFrame): OpenDiscourse as returned by get_open_discourse
+        save (bool): Writes the result to the partitioned store of CorpusStore
+        near_duplicates (bool): Also drops near duplicates, see Deduplicator.deduplicate
 
-    rename_dict = {
-        "Datum": "date",
-        "Fraktion": "abbreviation",
-        "Vorname": "firstName",
-        "Nachname": "lastName",
-        "Rede": "speechContent",
-    }
+    Returns:
+        pl.DataFrame: Columns date, firstName, lastName, speakerId, speechContent and abbreviation
+        sorted by date, encoded as described in CorpusStore.encode_corpus
+    """
 
-    # Rename the columns
-    df_xml = df_xml.rename(rename_dict)
+    df_xml = xml_speeches(ShardCache.scan_xml_shards("./data/raw/XML"))
 
-    try:
-        df_parla = df_parla.drop(["full_name"])
-        df_xml = df_xml.drop(["__index_level_0__"])
-    except:
-        pass
+    columns = ["abbreviation", "date", "firstName", "lastName", "speakerId", "speechContent"]
 
-    # Sort columns alphabetically
-    sorted_columns = sorted(df_xml.columns)  # Get sorted column names
-    df_xml = df_xml.select(sorted_columns)  # Reorder columns in DataFrame
+    df_parla = pl.concat([df_xml, df_parla.lazy().select(columns)]).collect()
 
-    # Sort columns alphabetically
-    sorted_columns = sorted(df_parla.columns)  # Get sorted column names
-    df_parla = df_parla.select(sorted_columns)  # Reorder columns in DataFrame
-
-    df_parla = pl.concat([df_xml, df_parla]).unique()
-
-    df_parla = __clean_df(df_parla)
-
-    df_politician = get_politician_df()
-
-    df_parla = df_parla.join(
-        df_politician,
-        left_on=["firstName", "lastName"],
-        right_on=["first_name", "last_name"],
-        how="left",
+    df_parla, dropped = Deduplicator.deduplicate(df_parla, near_duplicates)
+    logger.info(
+        "Dropped %d duplicate speeches: %s",
+        sum(dropped.values()),
+        ", ".join(f"{count} {reason}" for reason, count in dropped.items()),
     )
 
-    df_parla = df_parla.with_columns(
-        pl.when(pl.col("abbreviation").is_null())
-        .then(pl.col("Partei"))
-        .otherwise(pl.col("abbreviation"))
-        .alias("partei_aktualisiert")
+    df_parla, timings = clean_speeches(df_parla)
+    logger.info(
+        "Cleaned speeches in %s",
+        ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()),
     )
 
-    df_parla = df_parla.drop(["abbreviation", "Name", "Partei"])
-
-    df_parla = df_parla.rename({"partei_aktualisiert": "abbreviation"})
+    registry = SpeakerRegistry.update_registry(df_parla)
 
-    df_parla = df_parla.sort("date")
+    df_parla = (
+        SpeakerRegistry.attribute_parties(df_parla.lazy(), registry)
+        .select("date", "firstName", "lastName", "speakerId", "speechContent", "abbreviation")
+        .collect()
+        .pipe(CorpusStore.encode_corpus)
+    )
 
     if save:
-        Path("./data/formated/parquet/").mkdir(parents=True, exist_ok=True)
-        df_parla.write_parquet("./data/formated/parquet/ParlaMind.parquet")
+        CorpusStore.write_corpus(df_parla)
 
     return df_parla
-
-
-def get_politician_df():
-    politiker_liste = politiker = [
-        "Johann Saathoff (SPD)",
-        "Caren Marks (SPD)",
-        "Andreas Scheuer (CSU)",
-        "Carsten Schneider (SPD)",
-        "Marco Buschmann (FDP)",
-        "Klaus Holetschek (CSU)",
-        "Thomas Strobl (CDU)",
-        "Sven Schulze (CDU)",
-        "Boris Pistorius (SPD)",
-        "Anne Spiegel (Grüne)",
-        "Christian Lange (SPD)",
-        "Eva Högl (SPD)",
-        "Stephan Weil (SPD)",
-        "Andreas Bovenschulte (SPD)",
-        "Florian Pronold (SPD)",
-        "Siemtje Möller (SPD)",
-        "Thomas Schmidt (CDU)",
-        "Horst Seehofer (CSU)",
-        "Günter Krings (CDU)",
-        "Benjamin Strasser (FDP)",
-        "Dieter Janecek (Grüne)",
-        "Reiner Haseloff (CDU)",
-        "Helge Braun (CDU)",
-        "Nancy Faeser (SPD)",
-        "Olaf Scholz (SPD)",
-        "Peter Tauber (CDU)",
-        "Anna Lührmann (Grüne)",
-        "Dorothee Bär (CSU)",
-        "Anna Christmann (Grüne)",
-        "Rita Hagl-Kehl (SPD)",
-        "Wolfgang Schmidt (SPD)",
-        "Armin Schuster (CDU)",
-        "Steffen Bilger (CDU)",
-        "Kerstin Griese (SPD)",
-        "Luise Amtsberg (Grüne)",
-        "Jan-Niclas Gesenhues (Grüne)",
-        "Hubertus Heil (SPD)",
-        "Stephan Mayer (CSU)",
-        "Oliver Krischer (Grüne)",
-        "Cem Özdemir (Grüne)",
-        "Annette Widmann-Mauz (CDU)",
-        "Enak Ferlemann (CDU)",
-        "Daniela Behrens (SPD)",
-        "Bettina Hoffmann (Grüne)",
-        "Bettina Stark-Watzinger (FDP)",
-        "Julia Klöckner (CDU)",
-        "Karl Lauterbach (SPD)",
-        "Franziska Giffey (SPD)",
-        "Tobias Lindner (Grüne)",
-        "Judith Gerlach (CSU)",
-        "Claudia Müller (Grüne)",
-        "Anke Rehlinger (SPD)",
-        "Angela Merkel (CDU)",
-        "Ekin Deligöz (Grüne)",
-        "Michelle Müntefering (SPD)",
-        "Mahmut Özdemir (SPD)",
-        "Christian Lindner (FDP)",
-        "Joachim Stamp (FDP)",
-        "Jens Spahn (CDU)",
-        "Burkhard Blienert (SPD)",
-        "Thomas Hitschler (SPD)",
-        "Pascal Kober (FDP)",
-        "Robert Habeck (Grüne)",
-        "Heiko Maas (SPD)",
-        "Michael Müller (SPD)",
-        "Steffi Lemke (Grüne)",
-        "Florian Toncar (FDP)",
-        "Franziska Brantner (Grüne)",
-        "Armin Laschet (CDU)",
-        "Katja Kipping (Die Linke)",
-        "Bettina Jarasch (Grüne)",
-        "Peter Altmaier (CDU)",
-        "Markus Söder (CSU)",
-        "Cansel Kiziltepe (SPD)",
-        "Christine Lambrecht (SPD)",
-        "Sören Bartol (SPD)",
-        "Roman Poseck (CDU)",
-        "Felix Klein (parteilos)",
-        "Katja Hessel (FDP)",
-        "Mario Brandenburg (FDP)",
-        "Edgar Franke (SPD)",
-        "Thomas Gebhart (CDU)",
-        "Lena Kreck (Die Linke)",
-        "Gerd Müller (CSU)",
-        "Reem Alabali-Radovan (SPD)",
-        "Bodo Ramelow (Die Linke)",
-        "Michael Kellner (Grüne)",
-        "Jörg Steinbach (SPD)",
-        "Sven Lehmann (Grüne)",
-        "Annegret Kramp-Karrenbauer (CDU)",
-        "Daniela Kluckert (FDP)",
-        "Marion Gentges (CDU)",
-        "Mehmet Daimagüler (parteilos)",
-        "Oliver Luksic (FDP)",
-        "Felor Badenberg (parteilos)",
-        "Bärbel Kofler (SPD)",
-        "Claudia Roth (Grüne)",
-        "Rita Schwarzelühr-Sutter (SPD)",
-        "Peter Beuth (CDU)",
-        "Volker Wissing (FDP)",
-        "Jörg Kukies (SPD)",
-        "Christian Pegel (SPD)",
-        "Peter Tschentscher (SPD)",
-        "Alexander Schweitzer (SPD)",
-        "Maria Flachsbarth (CDU)",
-        "Malu Dreyer (SPD)",
-        "Sarah Ryglewski (SPD)",
-        "Anja Karliczek (CDU)",
-        "Annalena Baerbock (Grüne)",
-        "Sabine Dittmar (SPD)",
-        "Christian Kühn (Grüne)",
-        "Ophelia Nick (Grüne)",
-        "Katja Keul (Grüne)",
-        "Elisabeth Winkelmeier-Becker (CDU)",
-        "Kristina Sinemus (parteilos)",
-        "Natalie Pawlik (SPD)",
-        "Karl-Josef Laumann (CDU)",
-        "Thomas Silberhorn (CSU)",
-        "Klara Geywitz (SPD)",
-        "Boris Rhein (CDU)",
-        "Elisabeth Kaiser (SPD)",
-        "Lisa Paus (Grüne)",
-        "Thomas Bareiß (CDU)",
-        "Bettina Hagedorn (SPD)",
-        "Niels Annen (SPD)",
-        "Michael Roth (SPD)",
-        "Dietmar Woidke (SPD)",
-        "Anette Kramme (SPD)",
-        "Andreas Pinkwart (FDP)",
-        "Uli Grötsch (SPD)",
-        "Michael Theurer (FDP)",
-        "Svenja Schulze (SPD)",
-        "Monika Grütters (CDU)",
-        "Jens Brandenburg (FDP)",
-        "Ingmar Jung (CDU)",
-    ]
-
-    namen = []
-    first_names = []
-    last_names = []
-    parteien = []
-
-    party_translation = {
-        "AFD": "AfD",
-        "BSW": "BSW",  # No clear equivalent
-        "BÜNDNIS\xa090/DIEGRÜNEN": "Grüne",
-        "Grüne": "Grüne",
-        "CDU/CSU": "CDU/CSU",
-        "CSU": "CDU/CSU",
-        "CDU": "CDU/CSU",
-        "DIELINKE": "DIE LINKE.",
-        "Linke": "DIE LINKE.",
-        "FDP": "FDP",
-        "FRAKTIONSLOS": "Fraktionslos",
-        "parteilos": "Fraktionslos",
-        None: None,  # Represents missing or unspecified data
-        "SPD": "SPD",
-    }
-    for politiker in politiker_liste:
-        teile = politiker.strip().rsplit(" ", 1)
-        name = teile[0]
-        first_name = name.split()[0]
-        last_name = name.split()[1]
-        partei = party_translation[teile[1].strip("()")]
-
-        namen.append(name)
-        parteien.append(partei)
-        first_names.append(first_name)
-        last_names.append(last_name)
-
-    return pl.DataFrame(
-        {
-            "Name": namen,
-            "first_name": first_names,
-            "last_name": last_names,
-            "Partei": parteien,
-        }
-    )
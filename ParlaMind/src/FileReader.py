@@ -4,7 +4,7 @@ import re
 import os
 import json
 from io import StringIO
-import polars as pl
+from typing import Iterator
 import xml.etree.ElementTree as ET
 
 
@@ -182,65 +182,140 @@ def text_to_json(text):
 
 
 
-def xml_to_polars(xml_string):
-    """Parses XML of German Bundestag plenary protocols into a polars DataFrame."""
+# Bump whenever a change to the parser changes its output, cached shards are keyed by it
+PARSER_VERSION = 2
 
-    tree = ET.parse(StringIO(xml_string))
-    root = tree.getroot()
+XML_SCHEMA = {
+    "Datum": pl.String,
+    "WahlperiodenNr": pl.Int64,
+    "SitzungsNr": pl.Int64,
+    "RednerId": pl.String,
+    "Fraktion": pl.String,
+    "Titel": pl.String,
+    "Vorname": pl.String,
+    "Nachname": pl.String,
+    "Rede": pl.String,
+    "Kommentare": pl.List(pl.String),
+}
 
-    data = []
-    for rede in root.findall(".//rede"):
-        
-        redner = [a for a in rede.findall("p") if a.items() == [('klasse','redner')]][0]
 
-        name = redner.find("redner").find("name")
-        if name is not None:
-            datum = root.attrib.get("sitzung-datum")
-            wahlperioden_nr = int(root.attrib.get("wahlperiode"))
-            sitzungs_nr = int(root.attrib.get("sitzung-nr"))
-            fraktion = name.find("fraktion").text if name.find("fraktion") is not None else None
-            titel = name.find("titel").text if name.find("titel") is not None else None
-            vorname = name.find("vorname").text if name.find("vorname") is not None else None
-            nachname = name.find("nachname").text if name.find("nachname") is not None else None
+def iter_speeches(source) -> Iterator[tuple]:
+    """Streams the speeches of a plenary protocol while it is parsed. Every <rede> is
+    handed out as soon as it is closed and then dropped from the tree together with
+    everything outside of speeches, so memory stays flat for large sessions.
 
-            rede_text = ""
-            kommentare = []
+    Args:
+        source: Path or file object of the protocol
 
-            for element in rede:
-                if element.tag == "p" and "klasse" in element.attrib:
-                    rede_text += element.text if element.text is not None else ""
-                elif element.tag == "kommentar":
-                    kommentare.append(element.text)
+    Yields:
+        tuple: One row per speech in the column order of XML_SCHEMA
+    """
+    stack = []
+    in_rede = 0
+    session = None
+
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if session is None:
+                session = (
+                    element.attrib.get("sitzung-datum"),
+                    int(element.attrib.get("wahlperiode")),
+                    int(element.attrib.get("sitzung-nr")),
+                )
+            if element.tag == "rede":
+                in_rede += 1
+            stack.append(element)
+            continue
+
+        stack.pop()
+
+        if element.tag == "rede":
+            in_rede -= 1
+            speech = _parse_rede(element)
+            if speech is not None:
+                yield session + speech
+
+        if not in_rede and stack:
+            stack[-1].remove(element)
+
+
+def _parse_rede(rede: ET.Element) -> tuple | None:
+    redner = None
+    rede_text = []
+    kommentare = []
+
+    for element in rede:
+        if element.tag == "p" and "klasse" in element.attrib:
+            if redner is None and element.attrib == {"klasse": "redner"}:
+                redner = element
+            if element.text is not None:
+                rede_text.append(element.text)
+        elif element.tag == "kommentar":
+            kommentare.append(element.text)
+
+    person = redner.find("redner") if redner is not None else None
+    name = person.find("name") if person is not None else None
+    if name is None:
+        return None
+
+    fields = {}
+    for child in name:
+        fields.setdefault(child.tag, child.text)
+
+    return (
+        person.get("id"),
+        fields.get("fraktion"),
+        fields.get("titel"),
+        fields.get("vorname"),
+        fields.get("nachname"),
+        "".join(rede_text),
+        kommentare,
+    )
+
+
+def xml_file_to_polars(source) -> pl.DataFrame:
+    """Parses a German Bundestag plenary protocol into a polars DataFrame without
+    loading the whole file, see iter_speeches.
 
-            data.append({
-                "Datum": datum,
-                "WahlperiodenNr": wahlperioden_nr,
-                "SitzungsNr": sitzungs_nr,
-                "Fraktion": fraktion,
-                "Titel": titel,
-                "Vorname": vorname,
-                "Nachname": nachname,
-                "Rede": rede_text,
-                "Kommentare": kommentare
-            })
+    Args:
+        source: Path or file object of the protocol
 
-    df = pl.DataFrame(data)
-    #df = df.with_columns(pl.col("Datum").str.strptime(pl.Date, "%d.%m.%Y"))
-    return df
+    Returns:
+        pl.DataFrame: One row per speech with the columns of XML_SCHEMA
+    """
+    columns = [[] for _ in XML_SCHEMA]
 
+    for speech in iter_speeches(source):
+        for column, value in zip(columns, speech):
+            column.append(value)
 
+    return pl.DataFrame(dict(zip(XML_SCHEMA, columns)), schema=XML_SCHEMA)
 
 
-def put_all_xmls_into_one_df(folder_path):
+def xml_to_polars(xml_string):
+    """Parses XML of German Bundestag plenary protocols into a polars DataFrame."""
+
+    return xml_file_to_polars(StringIO(xml_string))
+
+
+
+
+def put_all_xmls_into_one_df(folder_path) -> pl.DataFrame:
+    """Parses all protocols of a folder into one DataFrame in this process. For parsing
+    in parallel and only once per file use ShardCache.scan_xml_shards.
+
+    Args:
+        folder_path: Folder with the .xml files
+
+    Returns:
+        pl.DataFrame: All speeches, ordered by file name and by position in the protocol
+    """
 
-    xml_list = [f"{folder_path}/{f}" for f in os.listdir(folder_path) if f.endswith('.xml')]
+    xml_list = sorted(f"{folder_path}/{f}" for f in os.listdir(folder_path) if f.endswith('.xml'))
 
-    dfs = []
+    if not xml_list:
+        return pl.DataFrame(schema=XML_SCHEMA)
 
-    for xml_file in xml_list:
-        with open(xml_file, "r", encoding="utf-8") as f:  # Encoding is important
-            xml_string = f.read()
-            df = xml_to_polars(xml_string)
-            dfs.append(df)
+    dfs = [xml_file_to_polars(xml_file) for xml_file in xml_list]
 
-    return pl.concat(dfs)
\ No newline at end of file
+    return pl.concat(dfs)
@@ -0,0 +1,217 @@
+from pathlib import Path
+
+import polars as pl
+
+from ParlaMind.src import Tokenizer
+
+SENTIWS_PATH = Path("./data/raw/SentiWS")
+
+# Normalization constant of the VADER compound score
+VADER_ALPHA = 15
+
+
+def load_sentiws(path: Path = SENTIWS_PATH) -> pl.DataFrame:
+    """Loads SentiWS as a lexicon of lowercased tokens and their polarity. Inflected forms
+    get the score of their base form, tokens listed more than once their mean score.
+
+    Args:
+        path (Path): Folder with SentiWS_v2.0_Positive.txt and SentiWS_v2.0_Negative.txt
+            of the original release, or a Parquet file with the columns word and
+            sentiment-score like the Hugging Face dataset community-datasets/senti_ws
+
+    Returns:
+        pl.DataFrame: The columns token and score
+    """
+    path = Path(path)
+    if path.is_file():
+        df_lexicon = pl.read_parquet(path).select(
+            token=pl.col("word"), score=pl.col("sentiment-score").cast(pl.Float64)
+        )
+    else:
+        # Lines look like "Abbau|NN<tab>-0.058<tab>Abbaus,Abbaues,Abbauen,Abbaue"
+        df_lexicon = (
+            pl.concat(
+                pl.read_csv(
+                    f,
+                    separator="\t",
+                    has_header=False,
+                    quote_char=None,
+                    new_columns=["word", "score", "inflections"],
+                )
+                for f in sorted(path.glob("SentiWS*.txt"))
+            )
+            .select(
+                pl.concat_list(
+                    pl.col("word").str.split("|").list.first(),
+                    pl.col("inflections").str.split(",").fill_null([]),
+                ).alias("token"),
+                pl.col("score").cast(pl.Float64),
+            )
+            .explode("token")
+        )
+
+    return (
+        df_lexicon.with_columns(pl.col("token").str.strip_chars().str.to_lowercase())
+        .filter(pl.col("token") != "")
+        .group_by("token")
+        .agg(pl.col("score").mean())
+        .sort("token")
+    )
+
+
+def load_vader(path: Path | None = None) -> pl.DataFrame:
+    """Loads the VADER lexicon as tokens and their mean valence
+
+    Args:
+        path (Path | None): vader_lexicon.txt, None for the one of nltk.download("vader_lexicon")
+
+    Returns:
+        pl.DataFrame: The columns token and score
+    """
+    if path is None:
+        import nltk
+
+        path = nltk.data.find("sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt")
+        source = path.open().read()
+    else:
+        source = Path(path).read_bytes()
+
+    # Lines look like "abandon<tab>-1.9<tab>0.53852<tab>[-2, -2, -2, ...]"
+    return (
+        pl.read_csv(
+            source,
+            separator="\t",
+            has_header=False,
+            quote_char=None,
+            columns=[0, 1],
+            new_columns=["token", "score"],
+        )
+        .group_by("token")
+        .agg(pl.col("score").cast(pl.Float64).mean())
+        .sort("token")
+    )
+
+
+def _lexicon_sums(
+    df_parla: pl.DataFrame, lexicon: pl.DataFrame, cache_path: Path, chunk_size: int
+) -> pl.DataFrame:
+    """Per speech sums over the tokens found in the lexicon, in order of df_parla"""
+    token_ids = Tokenizer.add_token_ids(
+        df_parla.select("speechContent"), cache_path, chunk_size=chunk_size
+    )["tokenIds"]
+    lexicon = (
+        lexicon.select(pl.col("token").cast(pl.String), pl.col("score").cast(pl.Float64))
+        .join(Tokenizer.load_vocabulary(cache_path), on="token", how="inner")
+        .select("tokenId", "score")
+    )
+
+    parts = []
+    for start in range(0, len(token_ids), chunk_size):
+        df_tokens = (
+            token_ids.slice(start, chunk_size)
+            .to_frame("tokenId")
+            .lazy()
+            .with_columns(
+                speechNr=pl.int_range(start, start + pl.len(), dtype=pl.UInt32),
+            )
+        )
+        df_sums = (
+            df_tokens.explode("tokenId")
+            # Most tokens are not in the lexicon, dropping them first keeps the join small
+            .filter(pl.col("tokenId").is_in(lexicon["tokenId"]))
+            .join(lexicon.lazy(), on="tokenId", how="inner")
+            .group_by("speechNr")
+            .agg(
+                positive=pl.col("score").filter(pl.col("score") > 0).sum(),
+                negative=pl.col("score").filter(pl.col("score") < 0).sum(),
+                compound=pl.col("score").sum(),
+                positive_hits=(pl.col("score") > 0).sum(),
+                negative_hits=(pl.col("score") < 0).sum(),
+            )
+        )
+        parts.append(
+            df_tokens.select("speechNr", tokens=pl.col("tokenId").list.len())
+            .join(df_sums, on="speechNr", how="left", coalesce=True)
+            .collect()
+        )
+
+    return pl.concat(parts).sort("speechNr").fill_null(0)
+
+
+def score_sentiws(
+    df_parla: pl.DataFrame,
+    lexicon: pl.DataFrame,
+    cache_path: Path = Tokenizer.CACHE_PATH,
+    chunk_size: int = 100_000,
+) -> pl.DataFrame:
+    """Adds the SentiWS polarity of every speech, summed over its tokens
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column speechContent
+        lexicon (pl.DataFrame): SentiWS as returned by load_sentiws
+        cache_path (Path): Root folder of the token cache, see Tokenizer.add_token_ids
+        chunk_size (int): Number of speeches scored at once, bounds the memory use
+
+    Returns:
+        pl.DataFrame: df_parla with sentiws_pos as sum of the positive scores, sentiws_neg
+        as negated sum of the negative scores and sentiws_compound as sum of all scores,
+        null where speechContent is null
+    """
+    sums = _lexicon_sums(df_parla, lexicon, cache_path, chunk_size)
+    has_text = df_parla["speechContent"].is_not_null()
+    return df_parla.with_columns(
+        sentiws_pos=pl.when(has_text).then(sums["positive"]),
+        sentiws_neg=pl.when(has_text).then(-sums["negative"]),
+        sentiws_compound=pl.when(has_text).then(sums["compound"]),
+    )
+
+
+def score_vader(
+    df_parla: pl.DataFrame,
+    lexicon: pl.DataFrame,
+    cache_path: Path = Tokenizer.CACHE_PATH,
+    chunk_size: int = 100_000,
+    alpha: float = VADER_ALPHA,
+) -> pl.DataFrame:
+    """Adds VADER scores computed from the lexicon valences of every speech. Like
+    SentimentIntensityAnalyzer.polarity_scores, tokens not in the lexicon count as
+    neutral and the compound is the normalized sum of valences. The rules for negations,
+    boosters, capitalization, "but" and punctuation are not applied.
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column speechContent
+        lexicon (pl.DataFrame): The VADER lexicon as returned by load_vader
+        cache_path (Path): Root folder of the token cache, see Tokenizer.add_token_ids
+        chunk_size (int): Number of speeches scored at once, bounds the memory use
+        alpha (float): Normalization constant of the compound score
+
+    Returns:
+        pl.DataFrame: df_parla with vader_neg, vader_neu, vader_pos and vader_compound,
+        null where speechContent is null
+    """
+    sums = _lexicon_sums(df_parla, lexicon, cache_path, chunk_size).select(
+        # VADER moves every positive and negative valence one further away from zero
+        positive=pl.col("positive") + pl.col("positive_hits"),
+        negative=pl.col("negative") - pl.col("negative_hits"),
+        neutral=pl.col("tokens") - pl.col("positive_hits") - pl.col("negative_hits"),
+        compound=pl.col("compound"),
+    )
+    total = sums["positive"] - sums["negative"] + sums["neutral"]
+    # Like VADER, texts without any token score 0
+    has_tokens = total > 0
+    has_text = df_parla["speechContent"].is_not_null()
+
+    return df_parla.with_columns(
+        vader_neg=pl.when(has_text).then(
+            pl.when(has_tokens).then(-sums["negative"] / total).otherwise(0.0)
+        ),
+        vader_neu=pl.when(has_text).then(
+            pl.when(has_tokens).then(sums["neutral"] / total).otherwise(0.0)
+        ),
+        vader_pos=pl.when(has_text).then(
+            pl.when(has_tokens).then(sums["positive"] / total).otherwise(0.0)
+        ),
+        vader_compound=pl.when(has_text).then(
+            sums["compound"] / (sums["compound"] ** 2 + alpha).sqrt()
+        ),
+    )
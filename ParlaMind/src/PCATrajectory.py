@@ -0,0 +1,159 @@
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+PCA_PATH = Path("./data/features/pca")
+COMPONENTS = ["PC1", "PC2"]
+
+
+def party_day_sums(df_pca: pl.DataFrame) -> pl.DataFrame:
+    """Sums the components of the speeches per party and day. Means over any range of days
+    follow from these sums, without the speeches themselves.
+
+    Args:
+        df_pca (pl.DataFrame): Speeches with the columns abbreviation, date, PC1 and PC2
+
+    Returns:
+        pl.DataFrame: abbreviation, date, the number of speeches and the sums PC1 and PC2
+    """
+    return (
+        df_pca.drop_nulls(["abbreviation", "date"])
+        .group_by("abbreviation", "date")
+        .agg(pl.len().alias("speeches"), *(pl.col(c).sum() for c in COMPONENTS))
+        .sort("abbreviation", "date")
+    )
+
+
+def load_party_days(path: Path = PCA_PATH) -> pl.DataFrame:
+    """Reads PCA_party_days.parquet, or sums PCA.parquet when it is missing
+
+    Args:
+        path (Path): Folder written by Projection.build_pca
+
+    Returns:
+        pl.DataFrame: The sums per party and day, see party_day_sums, with date as pl.Date
+    """
+    path = Path(path)
+    if (path / "PCA_party_days.parquet").is_file():
+        df_party_days = pl.read_parquet(path / "PCA_party_days.parquet")
+    else:
+        df_party_days = party_day_sums(pl.read_parquet(path / "PCA.parquet"))
+    return df_party_days.with_columns(
+        pl.col("abbreviation").cast(pl.String), pl.col("date").cast(pl.Date)
+    )
+
+
+def build_cube(df_party_days: pl.DataFrame) -> tuple[np.ndarray, date, np.ndarray]:
+    """Prefix sums of the speeches, PC1 and PC2 per party over the days, so the sums of any
+    range of days are the difference of two columns.
+
+    Args:
+        df_party_days (pl.DataFrame): Sums per party and day, see load_party_days
+
+    Returns:
+        tuple[np.ndarray, date, np.ndarray]: The parties, the first day and the cube of shape
+        (3, parties, days + 1), where cube[:, p, d] sums the days before day d for party p
+    """
+    parties = np.array(sorted(df_party_days["abbreviation"].unique()))
+    first_day = df_party_days["date"].min()
+    n_days = (df_party_days["date"].max() - first_day).days + 1
+
+    party_index = np.searchsorted(parties, df_party_days["abbreviation"].to_numpy())
+    day_index = (df_party_days["date"] - first_day).dt.total_days().to_numpy()
+
+    cube = np.zeros((3, len(parties), n_days + 1))
+    for i, column in enumerate(["speeches", *COMPONENTS]):
+        np.add.at(cube[i], (party_index, day_index + 1), df_party_days[column].to_numpy())
+    return parties, first_day, np.cumsum(cube, axis=2)
+
+
+def window_means(parties: np.ndarray, cube: np.ndarray, start: int, end: int) -> pl.DataFrame:
+    """Mean PC1 and PC2 of every party with speeches between the days start and end
+
+    Args:
+        parties (np.ndarray): The parties of the cube
+        cube (np.ndarray): Prefix sums, see build_cube
+        start (int): First day of the window, counted from the first day of the cube
+        end (int): Last day of the window, inclusive
+
+    Returns:
+        pl.DataFrame: abbreviation, speeches, PC1 and PC2, one row per party with speeches
+    """
+    speeches, pc1, pc2 = cube[:, :, end + 1] - cube[:, :, start]
+    found = speeches > 0
+    return pl.DataFrame(
+        {
+            "abbreviation": parties[found],
+            "speeches": speeches[found].astype(np.uint32),
+            "PC1": pc1[found] / speeches[found],
+            "PC2": pc2[found] / speeches[found],
+        }
+    )
+
+
+def trajectories(
+    df_party_days: pl.DataFrame,
+    window_days: int = 30,
+    step_days: int = 1,
+    min_speeches: int = 1,
+) -> pl.DataFrame:
+    """Mean PC1 and PC2 of every party in sliding windows over all days, computed for all
+    windows at once from the prefix sums
+
+    Args:
+        df_party_days (pl.DataFrame): Sums per party and day, see load_party_days
+        window_days (int): Number of days per window
+        step_days (int): Number of days between the starts of two windows
+        min_speeches (int): Leave out parties with fewer speeches in a window
+
+    Returns:
+        pl.DataFrame: windowStart, windowEnd, abbreviation, speeches, PC1 and PC2, one row
+        per window and party with speeches
+    """
+    parties, first_day, cube = build_cube(df_party_days)
+    n_days = cube.shape[2] - 1
+    starts = np.arange(0, max(n_days - window_days + 1, 1), step_days)
+    ends = np.minimum(starts + window_days, n_days)
+
+    speeches, pc1, pc2 = cube[:, :, ends] - cube[:, :, starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pc1, pc2 = pc1 / speeches, pc2 / speeches
+
+    window_starts = np.datetime64(first_day, "D") + starts
+    return (
+        pl.DataFrame(
+            {
+                "windowStart": np.tile(window_starts, len(parties)),
+                "windowEnd": np.tile(window_starts + (ends - starts - 1), len(parties)),
+                "abbreviation": np.repeat(parties, len(starts)),
+                "speeches": speeches.ravel().astype(np.uint32),
+                "PC1": pc1.ravel(),
+                "PC2": pc2.ravel(),
+            }
+        )
+        .filter(pl.col("speeches") >= max(min_speeches, 1))
+        .sort("windowStart", "abbreviation")
+    )
+
+
+def write_trajectories(
+    path: Path = PCA_PATH,
+    output: Path | None = None,
+    **kwargs,
+) -> Path:
+    """Computes the trajectories of all parties and writes them to Parquet, see trajectories
+
+    Args:
+        path (Path): Folder written by Projection.build_pca
+        output (Path | None): Parquet file, None for PCA_trajectories.parquet in path
+        **kwargs: Further arguments of trajectories
+
+    Returns:
+        Path: The Parquet file
+    """
+    output = Path(output or Path(path) / "PCA_trajectories.parquet")
+    trajectories(load_party_days(path), **kwargs).write_parquet(output)
+    return output
+
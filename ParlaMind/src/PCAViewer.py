@@ -0,0 +1,269 @@
+import sys
+import tkinter as tk
+from tkinter import ttk
+import numpy as np
+import polars as pl
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+from datetime import timedelta
+
+from ParlaMind.src import PCATrajectory
+
+# Milliseconds the plot waits for further slider events before it is redrawn
+DEBOUNCE_MS = 30
+
+
+class DateSliderApp:
+    def __init__(self, root, party_days):
+        self.root = root
+        self.root.title("PCA Analysis with Triple Sliders")
+        
+        # Initialize data
+        self.parties, self.min_date, self.cube = PCATrajectory.build_cube(party_days)
+        self.total_days = self.cube.shape[2] - 1
+        self.block_slider_events = False
+        self.pending_plot = None
+        self.last_state = None
+        
+        # Setup UI
+        self.create_widgets()
+        self.setup_sliders()
+        self.update_plot()
+
+    def create_widgets(self):
+        # Main container
+        main_frame = ttk.Frame(self.root)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Control panel
+        control_frame = ttk.LabelFrame(main_frame, text="Controls")
+        control_frame.pack(side=tk.LEFT, fill=tk.Y)
+
+        # Center point checkbox
+        self.show_center_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(control_frame, text="Show Center (0,0)", variable=self.show_center_var,
+                        command=self.update_plot).pack(anchor=tk.W, pady=5)
+
+        # Party checkboxes
+        ttk.Label(control_frame, text="Select Parties:").pack(anchor=tk.W)
+        self.party_vars = {}
+        
+        canvas = tk.Canvas(control_frame, height=200)
+        scrollbar = ttk.Scrollbar(control_frame, orient="vertical", command=canvas.yview)
+        self.scrollable_frame = ttk.Frame(canvas)
+        
+        self.scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        
+        for party in self.parties:
+            self.party_vars[party] = tk.BooleanVar(value=True)
+            cb = ttk.Checkbutton(self.scrollable_frame, text=party, variable=self.party_vars[party],
+                                command=self.update_plot)
+            cb.pack(anchor=tk.W)
+            
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Plot area
+        plot_frame = ttk.Frame(main_frame)
+        plot_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+        
+        self.fig = Figure(figsize=(8, 6))
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, master=plot_frame)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.create_artists()
+
+    def create_artists(self):
+        # Everything that moves with the sliders is created once and animated, so it is
+        # left out of full draws and blitted onto the cached background instead
+        self.ax.set_xlabel("PC1")
+        self.ax.set_ylabel("PC2")
+        self.points = self.ax.scatter([], [], s=100, animated=True)
+        self.center = self.ax.scatter(0, 0, s=100, c='red', marker='x', label='Center (0,0)',
+                                      animated=True)
+        self.labels = {
+            party: self.ax.annotate(party, (0, 0), textcoords="offset points", xytext=(5,5),
+                                    ha='center', animated=True, visible=False)
+            for party in self.parties
+        }
+        self.legend = self.ax.legend(loc="upper right")
+        self.title = self.ax.set_title("PCA Analysis", animated=True)
+
+        self.background = None
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def animated_artists(self):
+        return [self.points, self.center, self.title, *self.labels.values()]
+
+    def on_draw(self, event):
+        # A full draw, e.g. after resizing, renders everything but the animated artists
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self.animated_artists():
+            self.fig.draw_artist(artist)
+
+    def fit_limits(self, x, y):
+        """Adapts the axes to the points, returns whether the limits changed. Limits only
+        change when points leave them or fill less than a quarter of them, so most updates
+        keep the background."""
+        if self.center.get_visible():
+            x, y = np.append(x, 0), np.append(y, 0)
+        if len(x) == 0:
+            return False
+
+        low = np.array([x.min(), y.min()])
+        high = np.array([x.max(), y.max()])
+        (x0, x1), (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        current_low, current_high = np.array([x0, y0]), np.array([x1, y1])
+        if (np.all(low >= current_low) and np.all(high <= current_high)
+                and np.all(4 * (high - low) >= current_high - current_low)):
+            return False
+
+        margin = np.maximum(0.1 * (high - low), 1e-3 * np.maximum(np.abs(low), np.abs(high)) + 1e-9)
+        self.ax.set_xlim(low[0] - margin[0], high[0] + margin[0])
+        self.ax.set_ylim(low[1] - margin[1], high[1] + margin[1])
+        return True
+
+    def setup_sliders(self):
+        # Slider container
+        slider_frame = ttk.LabelFrame(self.root, text="Date Control")
+        slider_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        # Start Date slider
+        ttk.Label(slider_frame, text="Start Date:").pack(anchor=tk.W)
+        self.start_slider = ttk.Scale(slider_frame, from_=0, to=self.total_days-1, 
+                                    orient=tk.HORIZONTAL, command=lambda v: self.update_sliders('start'))
+        self.start_slider.pack(fill=tk.X, padx=5, pady=2)
+
+        # End Date slider
+        ttk.Label(slider_frame, text="End Date:").pack(anchor=tk.W)
+        self.end_slider = ttk.Scale(slider_frame, from_=0, to=self.total_days-1, 
+                                  orient=tk.HORIZONTAL, command=lambda v: self.update_sliders('end'))
+        self.end_slider.set(self.total_days-1)
+        self.end_slider.pack(fill=tk.X, padx=5, pady=2)
+
+        # Window Position slider
+        ttk.Label(slider_frame, text="Window Position:").pack(anchor=tk.W)
+        self.window_slider = ttk.Scale(slider_frame, from_=0, to=0, 
+                                     orient=tk.HORIZONTAL, command=lambda v: self.update_sliders('window'))
+        self.window_slider.pack(fill=tk.X, padx=5, pady=2)
+
+        # Date labels
+        self.date_labels = ttk.Label(slider_frame, text="")
+        self.date_labels.pack(pady=5)
+
+    def update_sliders(self, source):
+        if self.block_slider_events:
+            return
+
+        self.block_slider_events = True
+        try:
+            # Get current values
+            start = int(round(float(self.start_slider.get())))
+            end = int(round(float(self.end_slider.get())))
+            window_pos = int(round(float(self.window_slider.get())))
+
+            # Calculate window length
+            window_length = end - start + 1
+            
+            if source == 'start':
+                # Constrain end slider
+                end = max(start, end)
+                self.end_slider.set(end)
+                # Update window slider
+                self.window_slider.set(start)
+                
+            elif source == 'end':
+                # Constrain start slider
+                start = min(start, end)
+                self.start_slider.set(start)
+                # Update window slider
+                self.window_slider.set(start)
+                
+            elif source == 'window':
+                # Calculate new positions
+                new_start = max(0, min(window_pos, self.total_days - window_length))
+                new_end = new_start + window_length - 1
+                self.start_slider.set(new_start)
+                self.end_slider.set(new_end)
+                start, end = new_start, new_end
+
+            # Update window slider constraints
+            window_length = end - start + 1
+            max_window_pos = self.total_days - window_length
+            self.window_slider.config(to=max(0, max_window_pos))
+            self.window_slider.set(start)
+
+            # Update date labels
+            start_date = self.min_date + timedelta(days=start)
+            end_date = self.min_date + timedelta(days=end)
+            self.date_labels.config(
+                text=f"Selected Range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
+            )
+
+            # Update plot once the slider rests
+            self.schedule_plot()
+
+        finally:
+            self.block_slider_events = False
+
+    def schedule_plot(self):
+        # Slider events come faster than the plot can be drawn, only the last one is drawn
+        if self.pending_plot is not None:
+            self.root.after_cancel(self.pending_plot)
+        self.pending_plot = self.root.after(DEBOUNCE_MS, self.update_plot)
+
+    def update_plot(self):
+        self.pending_plot = None
+
+        # Get current parameters
+        start = int(self.start_slider.get())
+        end = int(self.end_slider.get())
+        selected_parties = [p for p, var in self.party_vars.items() if var.get()]
+
+        # Calculate date range
+        start_date = self.min_date + timedelta(days=start)
+        end_date = self.min_date + timedelta(days=end)
+
+        # Calculate means
+        grouped_means = PCATrajectory.window_means(self.parties, self.cube, start, end)
+        grouped_means = grouped_means.filter(pl.col("abbreviation").is_in(selected_parties))
+        x = grouped_means["PC1"].to_numpy()
+        y = grouped_means["PC2"].to_numpy()
+
+        # Many slider events end on the same day, nothing has to be drawn for them
+        title = f"PCA Analysis ({start_date} to {end_date})"
+        state = (tuple(grouped_means["abbreviation"]), x.tobytes(), y.tobytes(),
+                 self.show_center_var.get(), title)
+        if state == self.last_state:
+            return
+        full_draw = self.last_state is None or state[3] != self.last_state[3]
+        self.last_state = state
+
+        # Update plot
+        self.points.set_offsets(np.column_stack([x, y]))
+        self.center.set_visible(self.show_center_var.get())
+        self.legend.set_visible(self.show_center_var.get())
+        self.title.set_text(title)
+        for label in self.labels.values():
+            label.set_visible(False)
+        for party, px, py in zip(grouped_means["abbreviation"], x, y):
+            self.labels[party].xy = (px, py)
+            self.labels[party].set_visible(True)
+
+        if self.fit_limits(x, y) or full_draw or self.background is None:
+            # Ticks or the legend changed, on_draw caches the new background
+            self.canvas.draw_idle()
+        else:
+            self.canvas.restore_region(self.background)
+            for artist in self.animated_artists():
+                self.fig.draw_artist(artist)
+            self.canvas.blit(self.fig.bbox)
+
+if __name__ == "__main__":
+    # python -m ParlaMind.src.PCAViewer [folder], by default the folder Projection.build_pca writes to
+    party_days = PCATrajectory.load_party_days(*sys.argv[1:2])
+    root = tk.Tk()
+    app = DateSliderApp(root, party_days)
+    root.mainloop()
\ No newline at end of file
@@ -0,0 +1,148 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import scipy.linalg
+import scipy.sparse as sp
+from sklearn.decomposition import TruncatedSVD
+from tqdm import tqdm
+
+from ParlaMind.src import Embeddings, PCATrajectory, TopicFeatures
+from ParlaMind.src.PCATrajectory import COMPONENTS, PCA_PATH
+
+# Widest features projected through their covariance matrix, 8000 columns take 512 MB
+MAX_COVARIANCE_COLUMNS = 8_000
+
+
+def _chunks(n_rows: int, chunk_size: int):
+    for start in range(0, n_rows, chunk_size):
+        yield start, min(start + chunk_size, n_rows)
+
+
+def _principal_axes(features, n_components: int, scale: bool, chunk_size: int):
+    """Mean, standard deviation and principal axes of the rows, from the covariance matrix
+    accumulated chunk by chunk"""
+    n_rows, n_columns = features.shape
+    total = np.zeros(n_columns)
+    gram = np.zeros((n_columns, n_columns))
+    for start, end in tqdm(list(_chunks(n_rows, chunk_size)), desc="Accumulating covariance"):
+        chunk = features[start:end]
+        if sp.issparse(chunk):
+            total += np.asarray(chunk.sum(axis=0)).ravel()
+            gram += (chunk.T @ chunk).toarray()
+        else:
+            chunk = np.asarray(chunk, dtype=np.float64)
+            total += chunk.sum(axis=0)
+            gram += chunk.T @ chunk
+
+    mean = total / n_rows
+    covariance = gram / n_rows - np.outer(mean, mean)
+    # Like StandardScaler, columns without variance are left unscaled
+    std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+    std[std == 0] = 1
+    if not scale:
+        std[:] = 1
+    covariance /= np.outer(std, std)
+
+    # Only the eigenvectors of the largest eigenvalues, in ascending order
+    _, vectors = scipy.linalg.eigh(
+        covariance, subset_by_index=[n_columns - n_components, n_columns - 1]
+    )
+    axes = vectors[:, ::-1]
+    # The sign of an axis is arbitrary, make its largest loading positive
+    axes *= np.sign(axes[np.abs(axes).argmax(axis=0), np.arange(n_components)])
+    return mean, std, axes
+
+
+def project(
+    features,
+    n_components: int = 2,
+    method: str = "auto",
+    scale: bool = True,
+    chunk_size: int = 10_000,
+) -> np.ndarray:
+    """Projects every row of the features onto its first principal components.
+
+    With method "incremental" the covariance matrix is accumulated chunk by chunk, so the
+    rows are never densified at once. The result equals StandardScaler and PCA of the topic
+    modelling notebook, but needs memory for columns x columns values and is limited to
+    MAX_COVARIANCE_COLUMNS. With "randomized" a TruncatedSVD runs on the sparse matrix
+    without centering, for TF-IDF matrices too wide for a covariance matrix. "auto" picks
+    "incremental" up to MAX_COVARIANCE_COLUMNS and "randomized" beyond.
+
+    Args:
+        features (np.ndarray | sp.csr_matrix): One row per speech, e.g. from
+            TopicFeatures.load_matrix or Embeddings.load_store, may be memory mapped
+        n_components (int): Number of components
+        method (str): "auto", "incremental" or "randomized"
+        scale (bool): Scale every column to unit variance, only for "incremental"
+        chunk_size (int): Number of rows read at once
+
+    Returns:
+        np.ndarray: The components of every row, of shape (rows, n_components)
+    """
+    if method == "auto":
+        method = "incremental" if features.shape[1] <= MAX_COVARIANCE_COLUMNS else "randomized"
+    if method == "incremental" and features.shape[1] > MAX_COVARIANCE_COLUMNS:
+        raise ValueError(
+            f"{features.shape[1]} columns are too many for a covariance matrix, "
+            f"at most {MAX_COVARIANCE_COLUMNS}, use method randomized"
+        )
+    if method == "randomized":
+        return TruncatedSVD(n_components, algorithm="randomized", random_state=0).fit_transform(
+            features
+        )
+    if method != "incremental":
+        raise ValueError(f"Unknown method {method}, use auto, incremental or randomized")
+
+    mean, std, axes = _principal_axes(features, n_components, scale, chunk_size)
+    # (x - mean) / std @ axes, without densifying sparse rows
+    weights = axes / std[:, None]
+    offset = mean @ weights
+
+    components = np.empty((features.shape[0], n_components))
+    for start, end in _chunks(features.shape[0], chunk_size):
+        chunk = features[start:end]
+        if not sp.issparse(chunk):
+            chunk = np.asarray(chunk, dtype=np.float64)
+        components[start:end] = chunk @ weights - offset
+    return components
+
+
+def build_pca(
+    source: Path,
+    path: Path = PCA_PATH,
+    **kwargs,
+) -> Path:
+    """Projects the speeches of a TF-IDF matrix or embedding store onto two principal
+    components and writes PCA.parquet with one row per speech, as read by the PCA viewer,
+    and PCA_party_days.parquet with the sums per party and day, see
+    PCATrajectory.party_day_sums.
+
+    Args:
+        source (Path): Folder of a TopicFeatures matrix, e.g. one period of
+            TopicFeatures.build_period_matrices, or of an Embeddings store
+        path (Path): Folder the files are written to
+        **kwargs: Further arguments of project
+
+    Returns:
+        Path: The folder of the files
+    """
+    source = Path(source)
+    if (source / "store.json").is_file():
+        features, df_rows = Embeddings.load_store(source)
+    else:
+        features, df_rows, _ = TopicFeatures.load_matrix(source)
+
+    components = project(features, len(COMPONENTS), **kwargs)
+    df_pca = df_rows.select(
+        *(pl.Series(c, components[:, i]) for i, c in enumerate(COMPONENTS)),
+        "abbreviation",
+        "date",
+    )
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    df_pca.write_parquet(path / "PCA.parquet")
+    PCATrajectory.party_day_sums(df_pca).write_parquet(path / "PCA_party_days.parquet")
+    return path
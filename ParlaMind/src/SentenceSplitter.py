@@ -0,0 +1,219 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import polars as pl
+import spacy
+from tqdm import tqdm
+
+from ParlaMind.src import SpeechCache
+
+CACHE_PATH = Path("./data/cache/sentences")
+# Bump whenever the pipeline changes the sentence boundaries, offsets cached by an older
+# version are then no longer used
+SPLITTER_VERSION = 1
+
+CACHE_SCHEMA = {
+    "speechHash": pl.UInt64,
+    "sentenceStarts": pl.List(pl.UInt32),
+    "sentenceEnds": pl.List(pl.UInt32),
+}
+
+# Pipeline of the current process, loaded once by _load_pipeline
+_nlp = None
+
+
+def _load_pipeline() -> None:
+    """Loads the pipeline into the current process, also the initializer of the worker processes"""
+    global _nlp
+    if _nlp is not None:
+        return
+
+    # Only the German tokenizer exceptions and punctuation rules, no statistical model
+    _nlp = spacy.blank("de")
+    _nlp.add_pipe("sentencizer")
+    _nlp.max_length = 10_000_000
+
+
+def _split(texts: list[str], batch_size: int) -> tuple[list[list[int]], list[list[int]]]:
+    """Character offsets of the first and behind the last character of every sentence"""
+    starts = []
+    ends = []
+    for doc in _nlp.pipe(texts, batch_size=batch_size):
+        sentences = list(doc.sents)
+        starts.append([sentence.start_char for sentence in sentences])
+        ends.append([sentence.end_char for sentence in sentences])
+    return starts, ends
+
+
+def _cache_dir(cache_path: Path) -> Path:
+    return Path(cache_path) / f"sentencizer-v{SPLITTER_VERSION}"
+
+
+def scan_cache(cache_path: Path = CACHE_PATH) -> pl.LazyFrame:
+    """Lazily scans all cached sentence offsets
+
+    Returns:
+        pl.LazyFrame: One row per speechHash with the columns of CACHE_SCHEMA
+    """
+    return SpeechCache.scan_parts(_cache_dir(cache_path), CACHE_SCHEMA)
+
+
+def update_cache(
+    speeches: pl.Series,
+    cache_path: Path = CACHE_PATH,
+    workers: int | None = None,
+    chunk_size: int = 50_000,
+    batch_size: int = 256,
+    shard: int = 0,
+    num_shards: int = 1,
+) -> int:
+    """Splits every speech that is not yet in the cache into sentences.
+
+    The rule based sentencizer of spaCy runs in a pool of processes that each build the
+    pipeline once. Offsets are stored after every chunk, keyed by CorpusStore.speech_hash,
+    so re-runs and updated corpora only split new speeches.
+
+    Args:
+        speeches (pl.Series): The speech texts
+        cache_path (Path): Root folder of the cache
+        workers (int | None): Number of worker processes, None for one per CPU
+        chunk_size (int): Number of speeches split before they are written to the cache
+        batch_size (int): Number of speeches per nlp.pipe batch
+        shard (int): Number of the shard to split, see SpeechCache.missing_speeches
+        num_shards (int): Number of shards the speeches are split into
+
+    Returns:
+        int: Number of speeches split
+    """
+    cache_dir = _cache_dir(cache_path)
+    df_missing = SpeechCache.missing_speeches(speeches, cache_dir, shard, num_shards)
+    if df_missing.is_empty():
+        return 0
+
+    workers = max(1, min(workers or os.cpu_count() or 1, df_missing.height))
+    executor = None
+    if workers > 1:
+        # A forked worker could hang on a lock of the polars thread pool of this process
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_pipeline,
+        )
+    else:
+        _load_pipeline()
+
+    try:
+        for start in tqdm(range(0, df_missing.height, chunk_size), desc="Splitting speeches"):
+            df_chunk = df_missing.slice(start, chunk_size)
+            texts = df_chunk["speechContent"].to_list()
+
+            if executor is None:
+                starts, ends = _split(texts, batch_size)
+            else:
+                size = -(-len(texts) // workers)
+                starts, ends = [], []
+                for shard_starts, shard_ends in executor.map(
+                    _split,
+                    [texts[i : i + size] for i in range(0, len(texts), size)],
+                    repeat(batch_size),
+                ):
+                    starts.extend(shard_starts)
+                    ends.extend(shard_ends)
+
+            SpeechCache.write_part(
+                cache_dir,
+                pl.DataFrame(
+                    {
+                        "speechHash": df_chunk["speechHash"],
+                        "sentenceStarts": starts,
+                        "sentenceEnds": ends,
+                    },
+                    schema=CACHE_SCHEMA,
+                ),
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return df_missing.height
+
+
+def add_sentence_offsets(
+    df_parla: pl.DataFrame,
+    cache_path: Path = CACHE_PATH,
+    workers: int | None = None,
+    **kwargs,
+) -> pl.DataFrame:
+    """Adds the character offsets of the sentences of every speech as the list columns
+    sentenceStarts and sentenceEnds. Only speeches missing from the cache are split, see
+    update_cache.
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column speechContent
+        cache_path (Path): Root folder of the cache
+        workers (int | None): Number of worker processes, None for one per CPU
+        **kwargs: Further arguments of update_cache
+
+    Returns:
+        pl.DataFrame: df_parla with the offset columns, null where speechContent is null
+    """
+    update_cache(df_parla["speechContent"], cache_path, workers, **kwargs)
+    return SpeechCache.join_cached(df_parla, _cache_dir(cache_path), CACHE_SCHEMA)
+
+
+def _cut(df_parla: pl.DataFrame) -> list[list[str] | None]:
+    # Python strings index characters in constant time, while polars' str.slice has to
+    # walk the UTF-8 bytes up to every offset
+    return [
+        None if starts is None else [text[start:end] for start, end in zip(starts, ends)]
+        for text, starts, ends in zip(
+            df_parla["speechContent"].to_list(),
+            df_parla["sentenceStarts"].to_list(),
+            df_parla["sentenceEnds"].to_list(),
+        )
+    ]
+
+
+def explode_sentences(df_parla: pl.DataFrame) -> pl.DataFrame:
+    """Turns speeches into one row per sentence, cut out of speechContent by the offsets
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the columns speechContent, sentenceStarts and sentenceEnds
+
+    Returns:
+        pl.DataFrame: The other columns of df_parla, speechNr as the row of the speech in
+        df_parla, sentenceNr as the position in the speech and the sentence
+    """
+    sentences = pl.Series(
+        "sentence",
+        [sentence for speech in _cut(df_parla) if speech for sentence in speech],
+        dtype=pl.String,
+    )
+    return (
+        df_parla.drop("speechContent")
+        .with_row_index("speechNr")
+        .explode("sentenceStarts", "sentenceEnds")
+        .drop_nulls("sentenceStarts")
+        .with_columns(
+            sentenceNr=pl.int_range(pl.len(), dtype=pl.UInt32).over("speechNr"),
+            sentence=sentences,
+        )
+        .drop("sentenceStarts", "sentenceEnds")
+    )
+
+
+def split_sentences(df_parla: pl.DataFrame) -> pl.DataFrame:
+    """Adds the sentences of every speech as the list column sentences
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the columns speechContent, sentenceStarts and sentenceEnds
+
+    Returns:
+        pl.DataFrame: df_parla with the column sentences, null where speechContent is null
+    """
+    return df_parla.with_columns(
+        pl.Series("sentences", _cut(df_parla), dtype=pl.List(pl.String))
+    )
@@ -0,0 +1,254 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import torch
+from germansentiment import SentimentModel
+from tqdm import tqdm
+
+from ParlaMind.src import SpeechCache
+
+CACHE_PATH = Path("./data/cache/sentiment")
+MODEL_NAME = "oliverguhr/german-sentiment-bert"
+# Bump whenever cleaning, truncation or batching change the scores, results cached by an
+# older version are then no longer used
+SCORER_VERSION = 1
+LABELS = ["positive", "negative", "neutral"]
+
+CACHE_SCHEMA = {
+    "speechHash": pl.UInt64,
+    "sent_pos": pl.Float32,
+    "sent_neg": pl.Float32,
+    "sent_neu": pl.Float32,
+    "sent_pred": pl.Enum(LABELS),
+}
+
+# Model of the current process, loaded once by _load_model
+_model = None
+_model_key = None
+
+
+def _load_model(model_name: str, threads: int, quantize: bool) -> None:
+    """Loads the model into the current process, also the initializer of the worker processes"""
+    global _model, _model_key
+    torch.set_num_threads(threads)
+    if _model_key == (model_name, quantize):
+        return
+
+    _model = SentimentModel(model_name)
+    _model.model.eval()
+    if quantize and _model.device == "cpu":
+        _model.model = torch.ao.quantization.quantize_dynamic(
+            _model.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    _model_key = (model_name, quantize)
+
+
+def _cache_dir(cache_path: Path, model_name: str, quantize: bool) -> Path:
+    quantized = "-int8" if quantize else ""
+    return Path(cache_path) / f"{model_name.replace('/', '--')}-v{SCORER_VERSION}{quantized}"
+
+
+def _batches(lengths: np.ndarray, max_tokens: int, max_batch_size: int) -> list[np.ndarray]:
+    """Groups texts of similar token count, so a batch holds at most max_tokens tokens
+    including padding. Short speeches are scored in large batches, long ones in small."""
+    order = np.argsort(-lengths, kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        # Sorted descending, so the first text of a batch sets its padded width
+        size = max(1, min(max_batch_size, max_tokens // int(lengths[order[start]])))
+        batches.append(order[start : start + size])
+        start += size
+    return batches
+
+
+def _predict(texts: list[str], max_tokens: int, max_batch_size: int) -> np.ndarray:
+    """Scores texts with the model of the current process
+
+    Returns:
+        np.ndarray: The probabilities of every text in the order of LABELS
+    """
+    tokenizer = _model.tokenizer
+    max_length = min(tokenizer.model_max_length, _model.model.config.max_position_embeddings)
+    input_ids = tokenizer(
+        [_model.clean_text(text) for text in texts], truncation=True, max_length=max_length
+    )["input_ids"]
+    lengths = np.fromiter(map(len, input_ids), dtype=np.int64, count=len(input_ids))
+
+    id2label = _model.model.config.id2label
+    columns = [LABELS.index(id2label[i]) for i in range(len(id2label))]
+
+    probabilities = np.empty((len(texts), len(LABELS)), dtype=np.float32)
+    with torch.inference_mode():
+        for batch in _batches(lengths, max_tokens, max_batch_size):
+            inputs = tokenizer.pad(
+                {"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt"
+            ).to(_model.device)
+            logits = _model.model(**inputs).logits
+            probabilities[np.ix_(batch, columns)] = torch.softmax(logits, dim=-1).cpu().numpy()
+
+    return probabilities
+
+
+def _predict_sharded(
+    texts: list[str],
+    executor: ProcessPoolExecutor | None,
+    workers: int,
+    max_tokens: int,
+    max_batch_size: int,
+) -> np.ndarray:
+    if executor is None:
+        return _predict(texts, max_tokens, max_batch_size)
+
+    # Every worker gets every workers-th text by length, so all shards take about as long
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    shards = [order[i::workers] for i in range(min(workers, len(texts)))]
+
+    probabilities = np.empty((len(texts), len(LABELS)), dtype=np.float32)
+    results = executor.map(
+        _predict,
+        [[texts[i] for i in shard] for shard in shards],
+        repeat(max_tokens),
+        repeat(max_batch_size),
+    )
+    for shard, result in zip(shards, results):
+        probabilities[shard] = result
+    return probabilities
+
+
+def _write_part(cache_dir: Path, hashes: pl.Series, probabilities: np.ndarray) -> None:
+    df_part = pl.DataFrame(
+        {
+            "speechHash": hashes,
+            "sent_pos": probabilities[:, 0],
+            "sent_neg": probabilities[:, 1],
+            "sent_neu": probabilities[:, 2],
+            "sent_pred": np.array(LABELS)[probabilities.argmax(axis=1)],
+        },
+        schema=CACHE_SCHEMA,
+    )
+    SpeechCache.write_part(cache_dir, df_part)
+
+
+def scan_cache(
+    cache_path: Path = CACHE_PATH, model_name: str = MODEL_NAME, quantize: bool = False
+) -> pl.LazyFrame:
+    """Lazily scans all cached scores of a model
+
+    Returns:
+        pl.LazyFrame: One row per speechHash with the columns of CACHE_SCHEMA
+    """
+    return SpeechCache.scan_parts(_cache_dir(cache_path, model_name, quantize), CACHE_SCHEMA)
+
+
+def update_cache(
+    speeches: pl.Series,
+    cache_path: Path = CACHE_PATH,
+    model_name: str = MODEL_NAME,
+    workers: int = 1,
+    chunk_size: int = 20_000,
+    max_tokens: int = 8192,
+    max_batch_size: int = 64,
+    quantize: bool = False,
+    shard: int = 0,
+    num_shards: int = 1,
+) -> int:
+    """Scores every speech that is not yet in the cache of the model.
+
+    Speeches are keyed by CorpusStore.speech_hash, so re-runs and updated corpora only
+    score new texts. Scores are stored after every chunk, an interrupted run loses at most
+    one chunk. Several processes or machines can fill one cache by scoring different
+    shards, see SpeechCache.missing_speeches.
+
+    Args:
+        speeches (pl.Series): The speech texts
+        cache_path (Path): Root folder of the cache, every model gets its own folder
+        model_name (str): Hugging Face name of the germansentiment model
+        workers (int): Number of processes, each loads the model once and uses cpu_count / workers threads
+        chunk_size (int): Number of speeches scored before they are written to the cache
+        max_tokens (int): Maximum number of tokens including padding per batch
+        max_batch_size (int): Maximum number of speeches per batch
+        quantize (bool): Use the int8 quantized model on CPU, its scores are cached separately
+        shard (int): Number of the shard to score
+        num_shards (int): Number of shards the speeches are split into
+
+    Returns:
+        int: Number of speeches scored
+    """
+    cache_dir = _cache_dir(cache_path, model_name, quantize)
+    df_missing = SpeechCache.missing_speeches(speeches, cache_dir, shard, num_shards)
+    if df_missing.is_empty():
+        return 0
+
+    workers = max(1, min(workers, df_missing.height))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    executor = None
+    if workers > 1:
+        # Spawned instead of forked, a fork would copy the held locks of the polars and
+        # torch thread pools of this process
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_model,
+            initargs=(model_name, threads, quantize),
+        )
+    else:
+        _load_model(model_name, threads, quantize)
+
+    try:
+        for start in tqdm(range(0, df_missing.height, chunk_size), desc="Scoring speeches"):
+            df_chunk = df_missing.slice(start, chunk_size)
+            probabilities = _predict_sharded(
+                df_chunk["speechContent"].to_list(),
+                executor,
+                workers,
+                max_tokens,
+                max_batch_size,
+            )
+            _write_part(cache_dir, df_chunk["speechHash"], probabilities)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return df_missing.height
+
+
+def add_sentiment(
+    df_parla: pl.DataFrame,
+    cache_path: Path = CACHE_PATH,
+    model_name: str = MODEL_NAME,
+    workers: int = 1,
+    quantize: bool = False,
+    **kwargs,
+) -> pl.DataFrame:
+    """Adds the sentiment of every speech as the columns sent_pos, sent_neg, sent_neu and
+    sent_pred. Only speeches missing from the cache are scored, see update_cache.
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column speechContent
+        cache_path (Path): Root folder of the cache
+        model_name (str): Hugging Face name of the germansentiment model
+        workers (int): Number of processes scoring in parallel
+        quantize (bool): Use the int8 quantized model on CPU
+        **kwargs: Further arguments of update_cache
+
+    Returns:
+        pl.DataFrame: df_parla with the sentiment columns, null where speechContent is null
+    """
+    update_cache(
+        df_parla["speechContent"],
+        cache_path,
+        model_name,
+        workers,
+        quantize=quantize,
+        **kwargs,
+    )
+
+    return SpeechCache.join_cached(
+        df_parla, _cache_dir(cache_path, model_name, quantize), CACHE_SCHEMA
+    )
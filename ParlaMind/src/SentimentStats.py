@@ -0,0 +1,274 @@
+import hashlib
+import json
+from collections.abc import Sequence
+from pathlib import Path
+
+import polars as pl
+
+from ParlaMind.src import CorpusStore
+
+CACHE_PATH = Path("./data/cache/sentiment_stats")
+# Bump whenever build_stats changes, tables cached by an older version are then rebuilt
+STATS_VERSION = 2
+
+# Parties of the sentiment plots
+PARTIES = ["AfD", "Grüne", "CDU/CSU", "FDP", "SPD", "DIE LINKE.", "BSW"]
+# Shorter speeches are mostly interjections and left out of the plots
+MIN_CHARS = 40
+
+# Scores averaged per group when the speeches have them, see Sentiment and LexiconSentiment
+SCORE_COLUMNS = [
+    "sent_pos",
+    "sent_neg",
+    "sent_neu",
+    "sentiws_pos",
+    "sentiws_neg",
+    "sentiws_compound",
+    "vader_neg",
+    "vader_neu",
+    "vader_pos",
+    "vader_compound",
+]
+KEY_COLUMNS = ["year", "wahlperiode", "abbreviation", "firstName", "lastName", "sent_pred"]
+
+# Labels of Sentiment.LABELS, not imported so the plots do not need the model
+LABELS = ["positive", "negative", "neutral"]
+# Sentence sentiment of sentiment.ipynb, one byte per sentence instead of a string
+SENTENCE_SENTIMENT = pl.List(pl.Enum(LABELS))
+# Number of sentences of every label per speech, in the order of LABELS
+SENTENCE_COLUMNS = ["pos_per_sentence", "neg_per_sentence", "neu_per_sentence"]
+
+
+def _scan(source: Path | pl.DataFrame | pl.LazyFrame) -> pl.LazyFrame:
+    if isinstance(source, (pl.DataFrame, pl.LazyFrame)):
+        return source.lazy()
+    path = Path(source)
+    return pl.scan_parquet(path) if path.is_file() else CorpusStore.scan_corpus(path)
+
+
+def sentence_counts(column: str = "sentences_sentiment") -> list[pl.Expr]:
+    """Expressions counting the sentences of every label per speech. They run natively
+    on the list column, without exploding it or looping over the sentences in Python.
+
+    Args:
+        column (str): List column with the label of every sentence
+
+    Returns:
+        list[pl.Expr]: The columns of SENTENCE_COLUMNS, null where column is null
+    """
+    sentences = pl.col(column).cast(SENTENCE_SENTIMENT)
+    return [
+        sentences.list.count_matches(label).alias(name)
+        for label, name in zip(LABELS, SENTENCE_COLUMNS)
+    ]
+
+
+def add_sentence_counts(
+    df_parla: pl.DataFrame | pl.LazyFrame, column: str = "sentences_sentiment"
+) -> pl.DataFrame | pl.LazyFrame:
+    """Stores the sentence sentiment as SENTENCE_SENTIMENT and adds the number of sentences
+    of every label per speech in one multithreaded pass. Written back with
+    CorpusStore.write_corpus, the counts are columns of the corpus and never counted again.
+
+    Args:
+        df_parla (pl.DataFrame | pl.LazyFrame): Speeches with a list of labels per speech
+        column (str): List column with the label of every sentence
+
+    Returns:
+        pl.DataFrame | pl.LazyFrame: df_parla with the columns of SENTENCE_COLUMNS
+    """
+    return df_parla.with_columns(
+        pl.col(column).cast(SENTENCE_SENTIMENT), *sentence_counts(column)
+    )
+
+
+def build_stats(
+    source: Path | pl.DataFrame | pl.LazyFrame, min_chars: int = MIN_CHARS
+) -> pl.DataFrame:
+    """Aggregates the speeches in one pass into the number of speeches and the sums of
+    their scores per year, Wahlperiode, party, speaker and predicted sentiment. All
+    sentiment plots can be computed from this table, see sentiment_counts and score_means.
+
+    Args:
+        source (Path | pl.DataFrame | pl.LazyFrame): Speeches with the columns date,
+            abbreviation, speechContent and sent_pred, or a Parquet file or corpus folder of them
+        min_chars (int): Leave out speeches with fewer characters
+
+    Returns:
+        pl.DataFrame: The key columns, speeches, for every score in SCORE_COLUMNS its
+        sum and number of non null values and the sums of SENTENCE_COLUMNS, counted from
+        sentences_sentiment unless the speeches already have them
+    """
+    df_parla = _scan(source)
+    schema = df_parla.collect_schema()
+    # Older exports like ParlaMind_all.parquet keep the date as %Y-%m-%d string
+    date = (
+        pl.col("date").str.to_date("%Y-%m-%d")
+        if schema["date"] == pl.String
+        else pl.col("date").cast(pl.Date)
+    )
+    keys = [c for c in KEY_COLUMNS if c in schema or c in ("year", "wahlperiode")]
+    scores = [c for c in SCORE_COLUMNS if c in schema]
+    sentences = [c for c in SENTENCE_COLUMNS if c in schema]
+    if not sentences and "sentences_sentiment" in schema:
+        df_parla = df_parla.with_columns(*sentence_counts())
+        sentences = SENTENCE_COLUMNS
+
+    return (
+        df_parla.filter(pl.col("speechContent").str.len_chars() >= min_chars)
+        .with_columns(date.alias("date"))
+        .with_columns(
+            *(pl.col(c).cast(pl.String) for c in keys if c not in ("year", "wahlperiode")),
+            year=pl.col("date").dt.year(),
+            wahlperiode=CorpusStore.wahlperiode(pl.col("date")),
+        )
+        .group_by(keys)
+        .agg(
+            pl.len().alias("speeches"),
+            *(pl.col(c).sum().alias(f"{c}_sum") for c in scores),
+            *(pl.col(c).count().alias(f"{c}_count") for c in scores),
+            *(pl.col(c).cast(pl.UInt64).sum().alias(f"{c}_sum") for c in sentences),
+        )
+        .sort(keys, nulls_last=True)
+        .collect()
+    )
+
+
+def _fingerprint(source: Path, min_chars: int) -> str:
+    """Key of the stats of a source, changes whenever one of its files changes"""
+    source = Path(source)
+    files = [source] if source.is_file() else sorted(source.rglob("*.parquet"))
+    stamps = [(str(f.resolve()), f.stat().st_size, f.stat().st_mtime_ns) for f in files]
+    key = json.dumps([STATS_VERSION, min_chars, stamps])
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def load_stats(
+    source: Path = CorpusStore.CORPUS_PATH,
+    cache_path: Path = CACHE_PATH,
+    min_chars: int = MIN_CHARS,
+) -> pl.LazyFrame:
+    """Lazily scans the stats of a Parquet file or corpus folder. They are built once by
+    build_stats and cached, until a file of the source changes.
+
+    Args:
+        source (Path): Parquet file or corpus folder of speeches with sent_pred, see build_stats
+        cache_path (Path): Folder of the cached stats
+        min_chars (int): Leave out speeches with fewer characters
+
+    Returns:
+        pl.LazyFrame: The stats, see build_stats
+    """
+    path = Path(cache_path) / f"stats-{_fingerprint(source, min_chars)}.parquet"
+    if not path.is_file():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        build_stats(source, min_chars).write_parquet(tmp_path)
+        tmp_path.replace(path)
+    return pl.scan_parquet(path)
+
+
+def _select(
+    stats: pl.DataFrame | pl.LazyFrame,
+    parties: Sequence[str] | None,
+    speaker: tuple[str, str] | None,
+) -> pl.LazyFrame:
+    stats = stats.lazy()
+    if parties is not None:
+        stats = stats.filter(pl.col("abbreviation").is_in(parties))
+    if speaker is not None:
+        stats = stats.filter(pl.col("firstName") == speaker[0], pl.col("lastName") == speaker[1])
+    return stats
+
+
+def sentiment_counts(
+    stats: pl.DataFrame | pl.LazyFrame,
+    by: Sequence[str] = ("year",),
+    parties: Sequence[str] | None = None,
+    speaker: tuple[str, str] | None = None,
+) -> pl.DataFrame:
+    """Number of speeches per predicted sentiment and their share within every group
+
+    Args:
+        stats (pl.DataFrame | pl.LazyFrame): See load_stats
+        by (Sequence[str]): Key columns to group by, e.g. ("abbreviation",) or ("abbreviation", "year")
+        parties (Sequence[str] | None): Only the speeches of these parties, None for all
+        speaker (tuple[str, str] | None): Only the speeches of this first and last name
+
+    Returns:
+        pl.DataFrame: The columns of by, sent_pred, speeches and percentage
+    """
+    by = list(by)
+    return (
+        _select(stats, parties, speaker)
+        .group_by([*by, "sent_pred"])
+        .agg(pl.col("speeches").sum())
+        .with_columns(percentage=pl.col("speeches") / pl.col("speeches").sum().over(by) * 100)
+        .sort([*by, "sent_pred"])
+        .collect()
+    )
+
+
+def score_means(
+    stats: pl.DataFrame | pl.LazyFrame,
+    columns: Sequence[str] = ("sent_pos", "sent_neg", "sent_neu"),
+    by: Sequence[str] = ("abbreviation", "year"),
+    parties: Sequence[str] | None = None,
+    speaker: tuple[str, str] | None = None,
+) -> pl.DataFrame:
+    """Mean scores of the speeches of every group, e.g. the yearly mean SentiWS compound
+    per party with columns=["sentiws_compound"]
+
+    Args:
+        stats (pl.DataFrame | pl.LazyFrame): See load_stats
+        columns (Sequence[str]): Scores of SCORE_COLUMNS to average
+        by (Sequence[str]): Key columns to group by
+        parties (Sequence[str] | None): Only the speeches of these parties, None for all
+        speaker (tuple[str, str] | None): Only the speeches of this first and last name
+
+    Returns:
+        pl.DataFrame: The columns of by, speeches and the mean of every score
+    """
+    by = list(by)
+    return (
+        _select(stats, parties, speaker)
+        .group_by(by)
+        .agg(
+            pl.col("speeches").sum(),
+            *((pl.col(f"{c}_sum").sum() / pl.col(f"{c}_count").sum()).alias(c) for c in columns),
+        )
+        .sort(by)
+        .collect()
+    )
+
+
+def sentence_shares(
+    stats: pl.DataFrame | pl.LazyFrame,
+    by: Sequence[str] = ("year",),
+    parties: Sequence[str] | None = None,
+    speaker: tuple[str, str] | None = None,
+) -> pl.DataFrame:
+    """Number of sentences per sentiment and their share of all sentences within every group
+
+    Args:
+        stats (pl.DataFrame | pl.LazyFrame): See load_stats, of speeches with sentence sentiment
+        by (Sequence[str]): Key columns to group by, e.g. ("abbreviation",)
+        parties (Sequence[str] | None): Only the speeches of these parties, None for all
+        speaker (tuple[str, str] | None): Only the speeches of this first and last name
+
+    Returns:
+        pl.DataFrame: The columns of by, SENTENCE_COLUMNS with the sums and pos_perc,
+        neg_perc and neu_perc with the shares in percent
+    """
+    by = list(by)
+    total = pl.sum_horizontal(SENTENCE_COLUMNS)
+    return (
+        _select(stats, parties, speaker)
+        .group_by(by)
+        .agg(pl.col(f"{c}_sum").sum().alias(c) for c in SENTENCE_COLUMNS)
+        .with_columns(
+            (pl.col(c) / total * 100).alias(f"{c.split('_')[0]}_perc") for c in SENTENCE_COLUMNS
+        )
+        .sort(by)
+        .collect()
+    )
@@ -0,0 +1,103 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import polars as pl
+
+from ParlaMind.src import FileReader
+from ParlaMind.src.SyncManifest import file_sha256
+
+CACHE_PATH = Path("./data/cache/xml_shards")
+
+
+def _write_shard(job: tuple[str, Path]) -> None:
+    xml_file, shard = job
+    tmp_path = shard.with_name(shard.name + ".tmp")
+    FileReader.xml_file_to_polars(xml_file).write_parquet(tmp_path)
+    tmp_path.replace(shard)
+
+
+def _file_hashes(xml_files: list[Path], index_path: Path) -> dict[str, str]:
+    """Returns the sha256 of every file. Hashes are remembered together with size and
+    mtime, so only files that were touched since the last run are read again."""
+    index = {}
+    if index_path.is_file():
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+
+    hashes = {}
+    new_index = {}
+    for xml_file in xml_files:
+        stat = xml_file.stat()
+        entry = index.get(xml_file.name)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            entry = [stat.st_size, stat.st_mtime_ns, file_sha256(xml_file)]
+        new_index[xml_file.name] = entry
+        hashes[xml_file.name] = entry[2]
+
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(new_index, f)
+
+    return hashes
+
+
+def scan_xml_shards(
+    folder_path, cache_path: Path = CACHE_PATH, workers: int | None = None
+) -> pl.LazyFrame:
+    """Lazily scans all protocols of a folder through a cache of Parquet shards.
+
+    Every XML file is parsed once into its own shard named after the file's sha256 and
+    FileReader.PARSER_VERSION. Later calls only parse new or changed files, everything
+    else is read from the existing shards. Shards no longer belonging to any file of the
+    folder are removed, so every folder needs its own cache_path.
+
+    Args:
+        folder_path: Folder with the .xml files
+        cache_path (Path): Folder of the shards
+        workers (int | None): Number of worker processes for parsing, None for one per CPU
+
+    Returns:
+        pl.LazyFrame: All speeches with the columns of FileReader.XML_SCHEMA, ordered by file name
+    """
+    cache_path = Path(cache_path)
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    xml_files = sorted(
+        (f for f in Path(folder_path).iterdir() if f.suffix == ".xml"),
+        key=lambda f: f.name,
+    )
+    hashes = _file_hashes(xml_files, cache_path / "index.json")
+
+    shards = [
+        cache_path / f"{hashes[f.name]}-v{FileReader.PARSER_VERSION}.parquet"
+        for f in xml_files
+    ]
+    # The same content under two names only has to be parsed once
+    missing = {
+        shard: (str(xml_file), shard)
+        for xml_file, shard in zip(xml_files, shards)
+        if not shard.is_file()
+    }
+
+    if missing:
+        workers = min(workers or os.cpu_count() or 1, len(missing))
+        if workers == 1:
+            for job in missing.values():
+                _write_shard(job)
+        else:
+            # Forked children inherit the locks of polars' thread pool in whatever state
+            # they are in and may hang forever, so the workers start fresh interpreters
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                list(executor.map(_write_shard, missing.values()))
+
+    for shard in set(cache_path.glob("*.parquet")) - set(shards):
+        shard.unlink()
+
+    if not shards:
+        return pl.LazyFrame(schema=FileReader.XML_SCHEMA)
+
+    return pl.scan_parquet(shards)
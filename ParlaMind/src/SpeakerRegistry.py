@@ -0,0 +1,344 @@
+from datetime import date
+from pathlib import Path
+
+import polars as pl
+
+REGISTRY_PATH = Path("./data/registry")
+
+# Members of government and the Bundesrat who speak without a faction in the protocols.
+# They have no MdB id in this list and are only found by name, valid for the whole corpus.
+KNOWN_POLITICIANS = [
+    "Johann Saathoff (SPD)",
+    "Caren Marks (SPD)",
+    "Andreas Scheuer (CSU)",
+    "Carsten Schneider (SPD)",
+    "Marco Buschmann (FDP)",
+    "Klaus Holetschek (CSU)",
+    "Thomas Strobl (CDU)",
+    "Sven Schulze (CDU)",
+    "Boris Pistorius (SPD)",
+    "Anne Spiegel (Grüne)",
+    "Christian Lange (SPD)",
+    "Eva Högl (SPD)",
+    "Stephan Weil (SPD)",
+    "Andreas Bovenschulte (SPD)",
+    "Florian Pronold (SPD)",
+    "Siemtje Möller (SPD)",
+    "Thomas Schmidt (CDU)",
+    "Horst Seehofer (CSU)",
+    "Günter Krings (CDU)",
+    "Benjamin Strasser (FDP)",
+    "Dieter Janecek (Grüne)",
+    "Reiner Haseloff (CDU)",
+    "Helge Braun (CDU)",
+    "Nancy Faeser (SPD)",
+    "Olaf Scholz (SPD)",
+    "Peter Tauber (CDU)",
+    "Anna Lührmann (Grüne)",
+    "Dorothee Bär (CSU)",
+    "Anna Christmann (Grüne)",
+    "Rita Hagl-Kehl (SPD)",
+    "Wolfgang Schmidt (SPD)",
+    "Armin Schuster (CDU)",
+    "Steffen Bilger (CDU)",
+    "Kerstin Griese (SPD)",
+    "Luise Amtsberg (Grüne)",
+    "Jan-Niclas Gesenhues (Grüne)",
+    "Hubertus Heil (SPD)",
+    "Stephan Mayer (CSU)",
+    "Oliver Krischer (Grüne)",
+    "Cem Özdemir (Grüne)",
+    "Annette Widmann-Mauz (CDU)",
+    "Enak Ferlemann (CDU)",
+    "Daniela Behrens (SPD)",
+    "Bettina Hoffmann (Grüne)",
+    "Bettina Stark-Watzinger (FDP)",
+    "Julia Klöckner (CDU)",
+    "Karl Lauterbach (SPD)",
+    "Franziska Giffey (SPD)",
+    "Tobias Lindner (Grüne)",
+    "Judith Gerlach (CSU)",
+    "Claudia Müller (Grüne)",
+    "Anke Rehlinger (SPD)",
+    "Angela Merkel (CDU)",
+    "Ekin Deligöz (Grüne)",
+    "Michelle Müntefering (SPD)",
+    "Mahmut Özdemir (SPD)",
+    "Christian Lindner (FDP)",
+    "Joachim Stamp (FDP)",
+    "Jens Spahn (CDU)",
+    "Burkhard Blienert (SPD)",
+    "Thomas Hitschler (SPD)",
+    "Pascal Kober (FDP)",
+    "Robert Habeck (Grüne)",
+    "Heiko Maas (SPD)",
+    "Michael Müller (SPD)",
+    "Steffi Lemke (Grüne)",
+    "Florian Toncar (FDP)",
+    "Franziska Brantner (Grüne)",
+    "Armin Laschet (CDU)",
+    "Katja Kipping (Die Linke)",
+    "Bettina Jarasch (Grüne)",
+    "Peter Altmaier (CDU)",
+    "Markus Söder (CSU)",
+    "Cansel Kiziltepe (SPD)",
+    "Christine Lambrecht (SPD)",
+    "Sören Bartol (SPD)",
+    "Roman Poseck (CDU)",
+    "Felix Klein (parteilos)",
+    "Katja Hessel (FDP)",
+    "Mario Brandenburg (FDP)",
+    "Edgar Franke (SPD)",
+    "Thomas Gebhart (CDU)",
+    "Lena Kreck (Die Linke)",
+    "Gerd Müller (CSU)",
+    "Reem Alabali-Radovan (SPD)",
+    "Bodo Ramelow (Die Linke)",
+    "Michael Kellner (Grüne)",
+    "Jörg Steinbach (SPD)",
+    "Sven Lehmann (Grüne)",
+    "Annegret Kramp-Karrenbauer (CDU)",
+    "Daniela Kluckert (FDP)",
+    "Marion Gentges (CDU)",
+    "Mehmet Daimagüler (parteilos)",
+    "Oliver Luksic (FDP)",
+    "Felor Badenberg (parteilos)",
+    "Bärbel Kofler (SPD)",
+    "Claudia Roth (Grüne)",
+    "Rita Schwarzelühr-Sutter (SPD)",
+    "Peter Beuth (CDU)",
+    "Volker Wissing (FDP)",
+    "Jörg Kukies (SPD)",
+    "Christian Pegel (SPD)",
+    "Peter Tschentscher (SPD)",
+    "Alexander Schweitzer (SPD)",
+    "Maria Flachsbarth (CDU)",
+    "Malu Dreyer (SPD)",
+    "Sarah Ryglewski (SPD)",
+    "Anja Karliczek (CDU)",
+    "Annalena Baerbock (Grüne)",
+    "Sabine Dittmar (SPD)",
+    "Christian Kühn (Grüne)",
+    "Ophelia Nick (Grüne)",
+    "Katja Keul (Grüne)",
+    "Elisabeth Winkelmeier-Becker (CDU)",
+    "Kristina Sinemus (parteilos)",
+    "Natalie Pawlik (SPD)",
+    "Karl-Josef Laumann (CDU)",
+    "Thomas Silberhorn (CSU)",
+    "Klara Geywitz (SPD)",
+    "Boris Rhein (CDU)",
+    "Elisabeth Kaiser (SPD)",
+    "Lisa Paus (Grüne)",
+    "Thomas Bareiß (CDU)",
+    "Bettina Hagedorn (SPD)",
+    "Niels Annen (SPD)",
+    "Michael Roth (SPD)",
+    "Dietmar Woidke (SPD)",
+    "Anette Kramme (SPD)",
+    "Andreas Pinkwart (FDP)",
+    "Uli Grötsch (SPD)",
+    "Michael Theurer (FDP)",
+    "Svenja Schulze (SPD)",
+    "Monika Grütters (CDU)",
+    "Jens Brandenburg (FDP)",
+    "Ingmar Jung (CDU)",
+]
+
+# Parties of KNOWN_POLITICIANS to the abbreviations of the corpus
+PARTY_TRANSLATION = {
+    "Grüne": "Grüne",
+    "CSU": "CDU/CSU",
+    "CDU": "CDU/CSU",
+    "Die Linke": "DIE LINKE.",
+    "FDP": "FDP",
+    "parteilos": "Fraktionslos",
+    "SPD": "SPD",
+}
+
+SCHEMA = {
+    "speakerId": pl.String,
+    "firstName": pl.String,
+    "lastName": pl.String,
+    "nameKey": pl.String,
+    "abbreviation": pl.String,
+    "valid_from": pl.Date,
+    "valid_to": pl.Date,
+}
+
+
+def name_key(first_name: pl.Expr, last_name: pl.Expr) -> pl.Expr:
+    """Normalized "first last" name used for lookups of speakers without id"""
+    return (
+        pl.concat_str([first_name.fill_null(""), last_name.fill_null("")], separator=" ")
+        .str.to_lowercase()
+        .str.replace_all(r"[^\w]+", " ")
+        .str.strip_chars()
+    )
+
+
+def _known_politicians() -> pl.DataFrame:
+    first_names, last_names, parties = [], [], []
+
+    for politician in KNOWN_POLITICIANS:
+        name, party = politician.rsplit(" (", 1)
+        # Everything before the last word belongs to the first name
+        first_name, last_name = name.rsplit(" ", 1)
+
+        first_names.append(first_name)
+        last_names.append(last_name)
+        parties.append(PARTY_TRANSLATION[party.rstrip(")")])
+
+    return pl.DataFrame(
+        {
+            "firstName": first_names,
+            "lastName": last_names,
+            "abbreviation": parties,
+            "valid_from": date(1949, 1, 1),
+        }
+    )
+
+
+def build_registry(df_speeches: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+    """Builds the faction memberships of every speaker from the speeches of the corpus.
+
+    Speeches with a speaker id and a faction are ordered by date. Every run of speeches
+    with the same faction becomes one membership that is valid until the next one starts,
+    so people who changed faction are attributed correctly before and after the change.
+    KNOWN_POLITICIANS are added as name-only memberships.
+
+    Args:
+        df_speeches (pl.DataFrame | pl.LazyFrame): Speeches with the columns speakerId, firstName, lastName, abbreviation and date
+
+    Returns:
+        pl.DataFrame: One row per membership with the columns of SCHEMA
+    """
+    observed = (
+        df_speeches.lazy()
+        .filter(pl.col("speakerId").is_not_null() & pl.col("abbreviation").is_not_null())
+        .select(
+            "speakerId",
+            "firstName",
+            "lastName",
+            "abbreviation",
+            "date",
+        )
+        .sort("speakerId", "date", maintain_order=True)
+        .with_columns(_run=pl.col("abbreviation").rle_id().over("speakerId"))
+        .group_by("speakerId", "_run")
+        .agg(
+            pl.col("firstName", "lastName", "abbreviation").last(),
+            valid_from=pl.col("date").min(),
+        )
+        .sort("speakerId", "_run")
+        .with_columns(
+            valid_to=pl.col("valid_from").shift(-1).over("speakerId") - pl.duration(days=1)
+        )
+        .collect()
+    )
+
+    return (
+        pl.concat([observed, _known_politicians()], how="diagonal_relaxed")
+        .with_columns(nameKey=name_key(pl.col("firstName"), pl.col("lastName")))
+        .select(pl.col(column).cast(dtype) for column, dtype in SCHEMA.items())
+    )
+
+
+def _versions() -> list[Path]:
+    return sorted(REGISTRY_PATH.glob("memberships-*.parquet"))
+
+
+def load_registry() -> pl.DataFrame | None:
+    """Returns the newest saved registry, None if there is none"""
+    versions = _versions()
+    return pl.read_parquet(versions[-1]) if versions else None
+
+
+def update_registry(df_speeches: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+    """Rebuilds the registry and saves it as a new version if it differs from the newest one
+
+    Args:
+        df_speeches (pl.DataFrame | pl.LazyFrame): Speeches, see build_registry
+
+    Returns:
+        pl.DataFrame: The current registry
+    """
+    registry = build_registry(df_speeches)
+    latest = load_registry()
+
+    if latest is not None and latest.equals(registry):
+        return latest
+
+    versions = _versions()
+    version = int(versions[-1].stem.split("-")[1]) + 1 if versions else 1
+
+    REGISTRY_PATH.mkdir(parents=True, exist_ok=True)
+    registry.write_parquet(REGISTRY_PATH / f"memberships-{version:04d}.parquet")
+
+    return registry
+
+
+def _valid_party(
+    df_speeches: pl.LazyFrame, registry: pl.LazyFrame, left_on: str, right_on: str
+) -> pl.LazyFrame:
+    """Party of every speech from the membership of its speaker valid on its date"""
+    # Before their first membership speakers had no other known faction, it holds back to the start
+    first = pl.col("valid_from") == pl.col("valid_from").min().over(right_on)
+    registry = registry.with_columns(
+        _from=pl.when(first).then(pl.lit(date.min)).otherwise("valid_from"),
+        _to=pl.col("valid_to").fill_null(date.max),
+    )
+    return (
+        df_speeches.select("_row", "date", left_on)
+        .join(registry, left_on=left_on, right_on=right_on, how="inner")
+        .filter(pl.col("date").is_between("_from", "_to"))
+        # A name can belong to several people, the most recent membership wins
+        .group_by("_row")
+        .agg(pl.col("abbreviation").sort_by("valid_from").last())
+    )
+
+
+def attribute_parties(df_speeches: pl.LazyFrame, registry: pl.DataFrame) -> pl.LazyFrame:
+    """Fills missing abbreviations from the registry. Speeches are hash joined by speaker
+    id to the memberships of their speaker and keep the one whose valid_from and valid_to
+    include their date, speeches still without faction the same way by normalized name.
+    The first membership of a speaker also covers the speeches before it, ended
+    memberships are never used after their valid_to.
+
+    Args:
+        df_speeches (pl.LazyFrame): Speeches with the columns speakerId, firstName, lastName, abbreviation and date
+        registry (pl.DataFrame): Memberships as returned by update_registry
+
+    Returns:
+        pl.LazyFrame: The speeches ordered by date
+    """
+    columns = df_speeches.collect_schema().names()
+    memberships = registry.lazy().select(
+        "speakerId", "nameKey", "abbreviation", "valid_from", "valid_to"
+    )
+    df_speeches = df_speeches.with_row_index("_row")
+    missing = df_speeches.filter(pl.col("abbreviation").is_null())
+
+    by_id = _valid_party(
+        missing.filter(pl.col("speakerId").is_not_null()),
+        memberships.filter(pl.col("speakerId").is_not_null()).drop("nameKey"),
+        "speakerId",
+        "speakerId",
+    ).rename({"abbreviation": "_id_party"})
+    # Only speeches the id could not attribute are joined by name
+    by_name = _valid_party(
+        missing.join(by_id, on="_row", how="anti").with_columns(
+            _name=name_key(pl.col("firstName"), pl.col("lastName"))
+        ),
+        memberships.drop("speakerId"),
+        "_name",
+        "nameKey",
+    ).rename({"abbreviation": "_name_party"})
+
+    return (
+        df_speeches.join(by_id, on="_row", how="left")
+        .join(by_name, on="_row", how="left")
+        .with_columns(abbreviation=pl.coalesce("abbreviation", "_id_party", "_name_party"))
+        .sort("date", "_row")
+        .select(columns)
+    )
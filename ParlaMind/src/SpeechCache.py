@@ -0,0 +1,87 @@
+import os
+import time
+from pathlib import Path
+
+import polars as pl
+
+from ParlaMind.src import CorpusStore
+
+
+def scan_parts(cache_dir: Path, schema: dict) -> pl.LazyFrame:
+    """Lazily scans all parts of a cache
+
+    Args:
+        cache_dir (Path): Folder of the cache
+        schema (dict): Schema of the parts including speechHash, used while the cache is empty
+
+    Returns:
+        pl.LazyFrame: One row per speechHash
+    """
+    cache_dir = Path(cache_dir)
+    if not any(cache_dir.glob("*.parquet")):
+        return pl.LazyFrame(schema=schema)
+    # Two runs filling the cache at the same time may both have stored a speech
+    return pl.scan_parquet(cache_dir / "*.parquet").unique("speechHash")
+
+
+def write_part(cache_dir: Path, df_part: pl.DataFrame) -> None:
+    """Adds a part to the cache. Parts are only visible once complete and their names are
+    unique per process, so several processes can fill one cache at the same time."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    part = cache_dir / f"part-{time.time_ns()}-{os.getpid()}.parquet"
+    tmp_path = part.with_name(part.name + ".tmp")
+    df_part.write_parquet(tmp_path)
+    tmp_path.replace(part)
+
+
+def missing_speeches(
+    speeches: pl.Series,
+    cache_dir: Path,
+    shard: int = 0,
+    num_shards: int = 1,
+) -> pl.DataFrame:
+    """Returns the distinct speeches that are not yet in a cache. With num_shards > 1 only
+    those whose hash modulo num_shards equals shard, so several processes or machines can
+    fill one cache together.
+
+    Args:
+        speeches (pl.Series): The speech texts
+        cache_dir (Path): Folder of the cache
+        shard (int): Number of the shard
+        num_shards (int): Number of shards the speeches are split into
+
+    Returns:
+        pl.DataFrame: The columns speechHash and speechContent
+    """
+    cached = scan_parts(cache_dir, {"speechHash": pl.UInt64}).select("speechHash").collect()
+    return (
+        pl.DataFrame([CorpusStore.speech_hash(speeches), speeches.alias("speechContent")])
+        .drop_nulls()
+        .unique("speechHash", keep="first", maintain_order=True)
+        .filter(pl.col("speechHash") % num_shards == shard)
+        .join(cached, on="speechHash", how="anti")
+    )
+
+
+def join_cached(df_parla: pl.DataFrame, cache_dir: Path, schema: dict) -> pl.DataFrame:
+    """Adds the cached columns to every speech, null where a speech is not cached
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column speechContent
+        cache_dir (Path): Folder of the cache
+        schema (dict): Schema of the parts, including speechHash
+
+    Returns:
+        pl.DataFrame: df_parla with all columns of schema except speechHash
+    """
+    return (
+        df_parla.with_columns(CorpusStore.speech_hash(df_parla["speechContent"]))
+        .join(
+            scan_parts(cache_dir, schema).collect(),
+            on="speechHash",
+            how="left",
+            maintain_order="left",
+        )
+        .drop("speechHash")
+    )
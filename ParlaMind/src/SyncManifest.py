@@ -0,0 +1,133 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+
+def file_sha256(path: Path) -> str:
+    """Returns the hex encoded sha256 of a file"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class SyncManifest:
+    """Persistent record of every downloaded DIP document, stored as json next to the files.
+
+    For every document it keeps the DIP id, Wahlperiode, Sitzung, the `aktualisiert`
+    timestamp of the API, the url, file name, byte size, mtime and sha256 of the download.
+    Together with the time of the last complete sync this allows a run to only list
+    documents that changed since then and to only download new or modified files. Files
+    damaged since their download are found by damaged_documents, independent of the listing.
+
+    Args:
+        path (Path): Location of the manifest file
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+        if self.path.is_file():
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        else:
+            data = {}
+
+        self.last_sync = data.get("last_sync")
+        self.synced_from = data.get("synced_from")
+        self.documents = data.get("documents", {})
+
+    def changed_since(self, start_date: str) -> str | None:
+        """Returns the timestamp to pass as f.aktualisiert.start, None if a full listing is needed
+
+        Args:
+            start_date (str): First date of the requested range as %Y-%m-%d
+        """
+        if self.last_sync is None or self.synced_from is None or start_date < self.synced_from:
+            return None
+        return self.last_sync
+
+    def needs_download(self, document: dict, file_name: Path) -> bool:
+        """Checks whether a listed document is new, was updated or its file is missing or truncated"""
+        entry = self.documents.get(str(document["id"]))
+        if entry is None or entry["aktualisiert"] != document.get("aktualisiert"):
+            return True
+
+        file_name = Path(file_name)
+        return not file_name.is_file() or file_name.stat().st_size != entry["size"]
+
+    def damaged_documents(self, folder: Path, verify: bool = False) -> list[str]:
+        """Checks the file of every entry. Only files whose mtime differs from the recorded
+        one are read to compare their sha256, matching files get their new mtime recorded.
+
+        Args:
+            folder (Path): Folder of the downloaded files
+            verify (bool): Compare the sha256 of every file, also of untouched ones
+
+        Returns:
+            list[str]: Ids of the documents whose file is missing, truncated or altered
+        """
+        damaged = []
+        for document_id, entry in self.documents.items():
+            file_name = Path(folder) / entry["file"]
+            if not file_name.is_file():
+                damaged.append(document_id)
+                continue
+
+            stat = file_name.stat()
+            if stat.st_size != entry["size"]:
+                damaged.append(document_id)
+            elif verify or stat.st_mtime_ns != entry.get("mtime"):
+                if file_sha256(file_name) != entry["sha256"]:
+                    damaged.append(document_id)
+                else:
+                    entry["mtime"] = stat.st_mtime_ns
+        return damaged
+
+    def record(self, document: dict, url: str, file_name: Path, size: int, sha256: str) -> None:
+        """Adds or replaces the entry of a document after a successful download"""
+        dokumentnummer = document.get("dokumentnummer", "")
+        sitzung = dokumentnummer.split("/")[-1] if "/" in dokumentnummer else None
+
+        self.documents[str(document["id"])] = {
+            "wahlperiode": document.get("wahlperiode"),
+            "sitzung": int(sitzung) if sitzung and sitzung.isdigit() else None,
+            "datum": document.get("datum"),
+            "aktualisiert": document.get("aktualisiert"),
+            "url": url,
+            "file": Path(file_name).name,
+            "size": size,
+            "mtime": Path(file_name).stat().st_mtime_ns,
+            "sha256": sha256,
+        }
+
+    def record_file(self, document_id: str, file_name: Path, size: int, sha256: str) -> None:
+        """Updates size, mtime and sha256 of an entry after its damaged file was downloaded again"""
+        self.documents[document_id].update(
+            size=size, mtime=Path(file_name).stat().st_mtime_ns, sha256=sha256
+        )
+
+    def mark_synced(self, started_at: datetime, start_date: str) -> None:
+        """Remembers a complete sync so the next run can request only changes since started_at"""
+        if self.synced_from is not None and start_date > self.synced_from:
+            # Older documents were not listed, changes to them would be lost
+            return
+        self.last_sync = started_at.isoformat(timespec="seconds")
+        self.synced_from = start_date
+
+    def save(self) -> None:
+        """Writes the manifest, the old file is only replaced once the new one is complete"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "last_sync": self.last_sync,
+                    "synced_from": self.synced_from,
+                    "documents": self.documents,
+                },
+                f,
+                ensure_ascii=False,
+                indent=1,
+            )
+        tmp_path.replace(self.path)
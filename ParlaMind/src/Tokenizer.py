@@ -0,0 +1,200 @@
+from functools import cache
+from pathlib import Path
+
+import polars as pl
+from spacy.lang.de.stop_words import STOP_WORDS
+
+from ParlaMind.src import SpeechCache
+
+CACHE_PATH = Path("./data/cache/tokens")
+# Bump whenever tokenize changes, token ids cached by an older version are then no longer used
+TOKENIZER_VERSION = 1
+
+# Words, numbers and underscores, everything else separates tokens
+TOKEN_PATTERN = r"\w+"
+
+# Words like "herr", "kollege" or years that occur in almost every speech, taken over from
+# the additional_filter of the topic modelling notebook
+PARLIAMENT_STOPWORDS_PATH = Path(__file__).with_name("stopwords_parliament.txt")
+
+VOCABULARY_SCHEMA = {"token": pl.String, "tokenId": pl.UInt32}
+CACHE_SCHEMA = {"speechHash": pl.UInt64, "tokenIds": pl.List(pl.UInt32)}
+
+
+def tokenize(expr: pl.Expr) -> pl.Expr:
+    """Lowercased word tokens of a text as a list, punctuation is dropped"""
+    return expr.str.to_lowercase().str.extract_all(TOKEN_PATTERN)
+
+
+@cache
+def stopwords(parliament: bool = True) -> frozenset[str]:
+    """German stopwords of spaCy, by default together with the PARLIAMENT_STOPWORDS
+
+    Args:
+        parliament (bool): Also include the words common to all Bundestag speeches
+    """
+    words = set(STOP_WORDS)
+    if parliament:
+        words.update(PARLIAMENT_STOPWORDS_PATH.read_text(encoding="utf-8").split())
+    return frozenset(words)
+
+
+def _cache_dir(cache_path: Path) -> Path:
+    return Path(cache_path) / f"v{TOKENIZER_VERSION}"
+
+
+def load_vocabulary(cache_path: Path = CACHE_PATH) -> pl.DataFrame:
+    """Returns the vocabulary of the token cache. Ids are never reassigned, new tokens only
+    get the next free ones, so cached token ids stay valid when the corpus grows.
+
+    Returns:
+        pl.DataFrame: The columns token and tokenId, ordered by tokenId
+    """
+    path = _cache_dir(cache_path) / "vocabulary.parquet"
+    if not path.is_file():
+        return pl.DataFrame(schema=VOCABULARY_SCHEMA)
+    return pl.read_parquet(path)
+
+
+def _save_vocabulary(vocabulary: pl.DataFrame, cache_path: Path) -> None:
+    path = _cache_dir(cache_path) / "vocabulary.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    vocabulary.write_parquet(tmp_path)
+    tmp_path.replace(path)
+
+
+def scan_cache(cache_path: Path = CACHE_PATH) -> pl.LazyFrame:
+    """Lazily scans all cached token ids
+
+    Returns:
+        pl.LazyFrame: One row per speechHash with the columns of CACHE_SCHEMA
+    """
+    return SpeechCache.scan_parts(_cache_dir(cache_path) / "speeches", CACHE_SCHEMA)
+
+
+def update_cache(
+    speeches: pl.Series, cache_path: Path = CACHE_PATH, chunk_size: int = 100_000
+) -> int:
+    """Tokenizes every speech that is not yet in the cache and stores its token ids.
+
+    Speeches are keyed by CorpusStore.speech_hash. New tokens are added to the vocabulary
+    before the ids referring to them are stored. Only one process may update a cache at a
+    time, as they would otherwise assign the same ids to different tokens.
+
+    Args:
+        speeches (pl.Series): The speech texts
+        cache_path (Path): Root folder of the cache
+        chunk_size (int): Number of speeches tokenized at once, bounds the memory use
+
+    Returns:
+        int: Number of speeches tokenized
+    """
+    speeches_dir = _cache_dir(cache_path) / "speeches"
+    df_missing = SpeechCache.missing_speeches(speeches, speeches_dir)
+    if df_missing.is_empty():
+        return 0
+
+    vocabulary = load_vocabulary(cache_path)
+    for start in range(0, df_missing.height, chunk_size):
+        df_tokens = (
+            df_missing.slice(start, chunk_size)
+            .select("speechHash", token=tokenize(pl.col("speechContent")))
+            .explode("token")
+        )
+
+        df_new = (
+            df_tokens.select(pl.col("token").drop_nulls().unique(maintain_order=True))
+            .join(vocabulary, on="token", how="anti")
+        )
+        if not df_new.is_empty():
+            vocabulary = pl.concat(
+                [
+                    vocabulary,
+                    df_new.with_columns(
+                        tokenId=pl.int_range(
+                            vocabulary.height, vocabulary.height + pl.len(), dtype=pl.UInt32
+                        )
+                    ),
+                ]
+            )
+            _save_vocabulary(vocabulary, cache_path)
+
+        SpeechCache.write_part(
+            speeches_dir,
+            # Token ids must stay in the order of the text, n-grams are built from them
+            df_tokens.join(vocabulary, on="token", how="left", maintain_order="left")
+            .group_by("speechHash", maintain_order=True)
+            .agg(tokenIds=pl.col("tokenId").drop_nulls()),
+        )
+
+    return df_missing.height
+
+
+def add_token_ids(
+    df_parla: pl.DataFrame,
+    cache_path: Path = CACHE_PATH,
+    drop_stopwords: bool = False,
+    chunk_size: int = 100_000,
+) -> pl.DataFrame:
+    """Adds the token ids of every speech as the list column tokenIds. Only speeches
+    missing from the cache are tokenized, see update_cache.
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column speechContent
+        cache_path (Path): Root folder of the cache
+        drop_stopwords (bool): Leave out the ids of stopwords()
+        chunk_size (int): Number of speeches tokenized at once
+
+    Returns:
+        pl.DataFrame: df_parla with the column tokenIds, null where speechContent is null
+    """
+    update_cache(df_parla["speechContent"], cache_path, chunk_size)
+    df_parla = SpeechCache.join_cached(
+        df_parla, _cache_dir(cache_path) / "speeches", CACHE_SCHEMA
+    )
+
+    if drop_stopwords:
+        stopword_ids = stopword_token_ids(cache_path)
+        df_parla = df_parla.with_columns(
+            pl.col("tokenIds").list.eval(
+                pl.element().filter(~pl.element().is_in(stopword_ids))
+            )
+        )
+    return df_parla
+
+
+def stopword_token_ids(cache_path: Path = CACHE_PATH, parliament: bool = True) -> pl.Series:
+    """Returns the ids of all stopwords in the vocabulary of the cache, see stopwords"""
+    return (
+        load_vocabulary(cache_path)
+        .filter(pl.col("token").is_in(list(stopwords(parliament))))["tokenId"]
+    )
+
+
+def decode(df_parla: pl.DataFrame, cache_path: Path = CACHE_PATH) -> pl.DataFrame:
+    """Turns the column tokenIds back into the list column tokens
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column tokenIds, see add_token_ids
+        cache_path (Path): Root folder of the cache the ids come from
+
+    Returns:
+        pl.DataFrame: df_parla with the column tokens
+    """
+    df_tokens = (
+        df_parla.select("tokenIds")
+        .with_row_index("speechNr")
+        .explode("tokenIds")
+        .join(
+            load_vocabulary(cache_path).rename({"tokenId": "tokenIds"}),
+            on="tokenIds",
+            how="left",
+            maintain_order="left",
+        )
+        .group_by("speechNr", maintain_order=True)
+        .agg(pl.col("token").drop_nulls())
+    )
+    return df_parla.with_columns(
+        tokens=pl.when(pl.col("tokenIds").is_not_null()).then(df_tokens["token"])
+    )
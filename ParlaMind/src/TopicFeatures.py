@@ -0,0 +1,382 @@
+import json
+import shutil
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import scipy.sparse as sp
+
+from ParlaMind.src import CorpusStore, Tokenizer
+
+FEATURES_PATH = Path("./data/features/tfidf")
+
+# Periods of the topic modelling notebook
+PERIODS = {
+    "2005-2009": ("2005-01-01", "2009-12-31"),
+    "2009-2013": ("2009-01-01", "2013-12-31"),
+    "2013-2017": ("2013-01-01", "2017-12-31"),
+    "2017-2021": ("2017-01-01", "2021-12-31"),
+    "2021-2025": ("2021-01-01", "2025-12-31"),
+}
+
+_BLOCK_SIZE = 1 << 24
+# Hash buckets of the first pass of _document_frequencies
+_BUCKETS = 1 << 22
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, a stable 64 bit hash of uint64 values"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _ngrams(token_ids: pl.Series, ngram_range: tuple[int, int]):
+    """Yields n, the row, the 64 bit key and the position of the first token of every
+    n-gram of the speeches. Unigram keys are the token ids, n-grams never span two speeches."""
+    lengths = token_ids.list.len().fill_null(0).to_numpy().astype(np.int64)
+    ids = token_ids.explode().drop_nulls().to_numpy().astype(np.uint64)
+
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    remaining = lengths[rows] - (np.arange(len(ids)) - starts[rows])
+
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        first = np.flatnonzero(remaining >= n)
+        if n == 1:
+            keys = ids[first]
+        else:
+            keys = _mix(ids[first] + (np.uint64(n) << np.uint64(32)))
+            for k in range(1, n):
+                keys = _mix(keys ^ ids[first + k])
+        yield n, rows[first], keys, ids, first
+
+
+def _columns(keys: np.ndarray, vocabulary: np.ndarray | None, n_features: int | None):
+    """Column of every key and whether it is part of the features"""
+    if vocabulary is None:
+        return (_mix(keys) % np.uint64(n_features)).astype(np.int64), None
+    columns = np.searchsorted(vocabulary, keys)
+    known = columns < len(vocabulary)
+    known[known] = vocabulary[columns[known]] == keys[known]
+    return columns, known
+
+
+def _speech_keys(
+    token_ids: pl.Series,
+    ngram_range: tuple[int, int],
+    n_features: int | None,
+    chunk_size: int,
+):
+    """Yields the keys, or hashed columns with n_features, of every chunk of speeches,
+    each at most once per speech"""
+    for start in range(0, len(token_ids), chunk_size):
+        parts = []
+        for _, rows, keys, _, _ in _ngrams(token_ids.slice(start, chunk_size), ngram_range):
+            if n_features is not None:
+                keys, _ = _columns(keys, None, n_features)
+            parts.append(pl.DataFrame({"row": rows, "key": keys.astype(np.uint64)}))
+        # Hashed n-grams of different length can share a column, unique over all of them
+        yield pl.concat(parts).unique()["key"].to_numpy()
+
+
+def _merge_counts(parts: list[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray]:
+    """Merges keys and counts, sorted by key, into one sorted array of distinct keys"""
+    keys = np.concatenate([k for k, _ in parts])
+    counts = np.concatenate([c for _, c in parts])
+    order = np.argsort(keys, kind="stable")
+    keys, counts = keys[order], counts[order]
+    first = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    return keys[first], np.add.reduceat(counts, first) if len(keys) else counts
+
+
+def _document_frequencies(
+    token_ids: pl.Series,
+    ngram_range: tuple[int, int],
+    n_features: int | None,
+    min_documents: float,
+    chunk_size: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Number of speeches containing every key, or every hashed column with n_features.
+
+    Without n_features only keys in at least min_documents speeches are kept. A first pass
+    counts the speeches per hash bucket, an upper bound of the count of every key in it,
+    and keys of buckets below min_documents are never stored, so rare n-grams, the bulk of
+    all trigrams, take no memory. The counts of every chunk are merged into one sorted
+    array once they outnumber it, which keeps the merging linear in the number of keys.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The sorted keys, or all columns, and their counts
+    """
+    if n_features is not None:
+        counts = np.zeros(n_features, dtype=np.int64)
+        for keys in _speech_keys(token_ids, ngram_range, n_features, chunk_size):
+            counts += np.bincount(keys.astype(np.int64), minlength=n_features)
+        return np.arange(n_features), counts
+
+    candidates = None
+    if min_documents > 1:
+        bucket_counts = np.zeros(_BUCKETS, dtype=np.int64)
+        for keys in _speech_keys(token_ids, ngram_range, _BUCKETS, chunk_size):
+            bucket_counts += np.bincount(keys.astype(np.int64), minlength=_BUCKETS)
+        candidates = bucket_counts >= min_documents
+        del bucket_counts
+
+    merged = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64))
+    pending = []
+    for keys in _speech_keys(token_ids, ngram_range, None, chunk_size):
+        if candidates is not None:
+            keys = keys[candidates[_columns(keys, None, _BUCKETS)[0]]]
+        keys, counts = np.unique(keys, return_counts=True)
+        pending.append((keys, counts))
+        if sum(len(k) for k, _ in pending) >= len(merged[0]):
+            merged = _merge_counts([merged, *pending])
+            pending = []
+    return _merge_counts([merged, *pending])
+
+
+def _document_limit(value: float | int, n_documents: int) -> float:
+    # Like sklearn, floats are a share of the documents and integers absolute counts
+    return value * n_documents if isinstance(value, float) else value
+
+
+def _write_array(path: Path, raw_path: Path, dtype) -> None:
+    """Turns a file of raw values into a .npy file that np.load can memory map"""
+    raw = np.memmap(raw_path, dtype=dtype, mode="r") if raw_path.stat().st_size else np.empty(0, dtype)
+    array = np.lib.format.open_memmap(path, mode="w+", dtype=raw.dtype, shape=raw.shape)
+    for start in range(0, len(raw), _BLOCK_SIZE):
+        array[start : start + _BLOCK_SIZE] = raw[start : start + _BLOCK_SIZE]
+    array.flush()
+    del array, raw
+    raw_path.unlink()
+
+
+def build_matrix(
+    df_parla: pl.DataFrame,
+    path: Path,
+    ngram_range: tuple[int, int] = (1, 3),
+    min_df: float | int = 0.0025,
+    max_df: float | int = 0.05,
+    n_features: int | None = None,
+    sublinear_tf: bool = True,
+    use_idf: bool = True,
+    norm: bool = True,
+    drop_stopwords: bool = True,
+    chunk_size: int = 20_000,
+    cache_path: Path = Tokenizer.CACHE_PATH,
+) -> Path:
+    """Builds the TF-IDF matrix of the speeches and stores it as memory mappable arrays.
+
+    Speeches are read from the token cache, see Tokenizer.add_token_ids. The matrix is
+    built in passes over chunks of speeches: the first counts in how many speeches every
+    n-gram occurs, see _document_frequencies, the second writes the weighted rows of every chunk to disk, so
+    the full matrix is never held in memory.
+
+    Columns are either the n-grams occurring in at least min_df and at most max_df
+    speeches, like TfidfVectorizer, or with n_features the n-grams hashed into that many
+    columns. Hashing needs no vocabulary and bounds the memory of the first pass, but the
+    columns have no names. Weights follow TfidfVectorizer: 1 + log(tf) with sublinear_tf,
+    the smoothed idf and rows scaled to unit length with norm.
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the column speechContent
+        path (Path): Folder of the matrix, see load_matrix
+        ngram_range (tuple[int, int]): Smallest and largest number of tokens per n-gram
+        min_df (float | int): Minimum number of speeches with an n-gram, floats as share of all speeches
+        max_df (float | int): Maximum number of speeches with an n-gram, floats as share of all speeches
+        n_features (int | None): Number of hashed columns, None for a pruned vocabulary
+        sublinear_tf (bool): Use 1 + log(tf) instead of the raw counts
+        use_idf (bool): Weight by the inverse document frequency
+        norm (bool): Scale every row to unit length
+        drop_stopwords (bool): Leave out Tokenizer.stopwords()
+        chunk_size (int): Number of speeches processed at once, bounds the memory use
+        cache_path (Path): Root folder of the token cache
+
+    Returns:
+        Path: The folder of the matrix
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    df_parla = Tokenizer.add_token_ids(
+        df_parla.filter(pl.col("speechContent").is_not_null()), cache_path, drop_stopwords
+    )
+    token_ids = df_parla["tokenIds"]
+    n_documents = len(token_ids)
+
+    min_documents = _document_limit(min_df, n_documents)
+    keys, document_frequency = _document_frequencies(
+        token_ids, ngram_range, n_features, min_documents, chunk_size
+    )
+    if n_features is None:
+        kept = (document_frequency >= min_documents) & (
+            document_frequency <= _document_limit(max_df, n_documents)
+        )
+        vocabulary, document_frequency = keys[kept], document_frequency[kept]
+        width = len(vocabulary)
+    else:
+        vocabulary = None
+        width = n_features
+
+    idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1 if use_idf else np.ones(width)
+
+    names = []
+    row_lengths = np.zeros(n_documents, dtype=np.int64)
+    with (
+        open(tmp_path / "data.raw", "wb") as f_data,
+        open(tmp_path / "indices.raw", "wb") as f_indices,
+    ):
+        for start in range(0, n_documents, chunk_size):
+            parts = []
+            for n, rows, keys, ids, first in _ngrams(token_ids.slice(start, chunk_size), ngram_range):
+                columns, known = _columns(keys, vocabulary, n_features)
+                if known is not None:
+                    rows, columns, keys, first = rows[known], columns[known], keys[known], first[known]
+                    # Remember the tokens of every column once for its name
+                    names.append(
+                        pl.DataFrame({"column": columns})
+                        .with_columns(
+                            tokenIds=pl.concat_list(
+                                pl.Series(ids[first + k], dtype=pl.UInt32) for k in range(n)
+                            )
+                        )
+                        .unique("column")
+                    )
+                parts.append(pl.DataFrame({"row": rows, "column": columns}))
+
+            if not parts:
+                continue
+            df_chunk = (
+                pl.concat(parts)
+                .group_by("row", "column")
+                .agg(tf=pl.len())
+                .sort("row", "column")
+            )
+            rows = df_chunk["row"].to_numpy()
+            columns = df_chunk["column"].to_numpy()
+            tf = df_chunk["tf"].to_numpy().astype(np.float64)
+
+            weights = (np.log(tf) + 1 if sublinear_tf else tf) * idf[columns]
+            if norm:
+                weights /= np.sqrt(np.bincount(rows, weights=weights**2))[rows]
+
+            f_data.write(weights.astype(np.float32).tobytes())
+            f_indices.write(columns.astype(np.int32).tobytes())
+            row_lengths[start : start + chunk_size] += np.bincount(
+                rows, minlength=min(chunk_size, n_documents - start)
+            )
+
+    _write_array(tmp_path / "data.npy", tmp_path / "data.raw", np.float32)
+    _write_array(tmp_path / "indices.npy", tmp_path / "indices.raw", np.int32)
+    indptr = np.concatenate([[0], np.cumsum(row_lengths)])
+    # scipy needs indices and indptr of the same type, int32 as long as it fits
+    np.save(tmp_path / "indptr.npy", indptr.astype(np.int32 if indptr[-1] < 2**31 else np.int64))
+
+    df_parla.with_columns(CorpusStore.speech_hash(df_parla["speechContent"])).drop(
+        "speechContent", "tokenIds"
+    ).write_parquet(tmp_path / "rows.parquet")
+
+    df_features = pl.DataFrame({"column": np.arange(width), "df": document_frequency, "idf": idf})
+    if vocabulary is not None:
+        df_names = pl.DataFrame(schema={"column": pl.Int64, "ngram": pl.String})
+        if names:
+            df_names = (
+                pl.concat(names)
+                .unique("column")
+                .explode("tokenIds")
+                .join(
+                    Tokenizer.load_vocabulary(cache_path),
+                    left_on="tokenIds",
+                    right_on="tokenId",
+                    how="left",
+                    maintain_order="left",
+                )
+                .group_by("column", maintain_order=True)
+                .agg(ngram=pl.col("token").str.join(" "))
+            )
+        df_features = df_features.join(df_names, on="column", how="left").sort("column")
+    df_features.write_parquet(tmp_path / "features.parquet")
+
+    with open(tmp_path / "matrix.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "shape": [n_documents, width],
+                "ngram_range": list(ngram_range),
+                "min_df": min_df,
+                "max_df": max_df,
+                "n_features": n_features,
+                "sublinear_tf": sublinear_tf,
+                "use_idf": use_idf,
+                "norm": norm,
+                "drop_stopwords": drop_stopwords,
+                "tokenizer_version": Tokenizer.TOKENIZER_VERSION,
+            },
+            f,
+            indent=1,
+        )
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.replace(path)
+    return path
+
+
+def build_period_matrices(
+    df_parla: pl.DataFrame,
+    periods: dict[str, tuple[str, str]] = PERIODS,
+    path: Path = FEATURES_PATH,
+    **kwargs,
+) -> dict[str, Path]:
+    """Builds one matrix per period with its own vocabulary, see build_matrix
+
+    Args:
+        df_parla (pl.DataFrame): Speeches with the columns date and speechContent
+        periods (dict[str, tuple[str, str]]): Name and first and last date as %Y-%m-%d of every period
+        path (Path): Root folder, every period is stored in a subfolder named after it
+        **kwargs: Further arguments of build_matrix
+
+    Returns:
+        dict[str, Path]: The folder of the matrix of every period
+    """
+    return {
+        name: build_matrix(
+            df_parla.filter(
+                pl.col("date").is_between(date.fromisoformat(start), date.fromisoformat(end))
+            ),
+            Path(path) / name,
+            **kwargs,
+        )
+        for name, (start, end) in periods.items()
+    }
+
+
+def load_matrix(path: Path) -> tuple[sp.csr_matrix, pl.DataFrame, pl.DataFrame]:
+    """Opens a matrix written by build_matrix. The arrays are memory mapped, so only the
+    parts used are read from disk.
+
+    Args:
+        path (Path): Folder of the matrix
+
+    Returns:
+        tuple[sp.csr_matrix, pl.DataFrame, pl.DataFrame]: The matrix, its rows with all
+        columns of the speeches except speechContent plus speechHash, and its columns
+        with df, idf and for a vocabulary the ngram
+    """
+    path = Path(path)
+    with open(path / "matrix.json", encoding="utf-8") as f:
+        shape = tuple(json.load(f)["shape"])
+
+    indptr = np.load(path / "indptr.npy", mmap_mode="r")
+    matrix = sp.csr_matrix(
+        (
+            np.load(path / "data.npy", mmap_mode="r"),
+            np.load(path / "indices.npy", mmap_mode="r").astype(indptr.dtype, copy=False),
+            indptr,
+        ),
+        shape=shape,
+        copy=False,
+    )
+    return matrix, pl.read_parquet(path / "rows.parquet"), pl.read_parquet(path / "features.parquet")
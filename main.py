@@ -1,10 +1,13 @@
+import logging
+
 from ParlaMind.src import FileReader, DataRetriever, FileProcessor
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
     DataRetriever.download_data(format="XML", start_year=2021)
 
-    df_parla = FileProcessor.get_open_discourse()
+    df_parla = FileProcessor.scan_open_discourse()
 
     df_parla = FileProcessor.concat_od_with_xml(df_parla, True)
 
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+os.environ.setdefault("DYNACONF_API_KEY", "test")
+
+from ParlaMind.src import AsyncDownloader, DataRetriever  # noqa: E402
+
+DOCUMENTS = [
+    {
+        "id": i,
+        "datum": f"2021-01-{i:02d}",
+        "aktualisiert": "2021-02-01T10:00:00+01:00",
+        "dokumentnummer": f"20/{i}",
+        "wahlperiode": 20,
+    }
+    for i in range(1, 6)
+]
+PAGE_SIZE = 2
+
+
+def _dip_app(requests: list) -> web.Application:
+    """Serves DOCUMENTS as a cursor paginated DIP listing together with their files"""
+
+    async def listing(request):
+        requests.append((request.path, dict(request.query)))
+        cursor = request.query.get("cursor", "0")
+        start = int(cursor)
+        origin = request.url.origin()
+        page = [
+            {**document, "fundstelle": {"pdf_url": f"{origin}/files/{document['id']}.pdf"}}
+            for document in DOCUMENTS[start : start + PAGE_SIZE]
+        ]
+        # Like DIP, the page after the last one repeats the cursor
+        next_cursor = str(start + len(page)) if page else cursor
+        return web.json_response(
+            {"numFound": len(DOCUMENTS), "documents": page, "cursor": next_cursor}
+        )
+
+    async def file(request):
+        requests.append((request.path, dict(request.query)))
+        return web.Response(body=f"<protokoll id={request.match_info['id']}/>".encode() * 100)
+
+    app = web.Application()
+    app.router.add_get("/plenarprotokoll", listing)
+    app.router.add_get("/files/{id}.xml", file)
+    return app
+
+
+@asynccontextmanager
+async def _serve(app: web.Application):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
+
+
+def test_iter_documents_follows_the_cursor(monkeypatch):
+    requests = []
+
+    async def main():
+        async with _serve(_dip_app(requests)) as url:
+            monkeypatch.setattr(DataRetriever, "API_URL", url)
+            totals = []
+            async with AsyncDownloader.AsyncDownloader() as downloader:
+                return [
+                    document
+                    async for document in DataRetriever.iter_documents(
+                        downloader, "plenarprotokoll", {"f.zuordnung": "BT"}, totals.append
+                    )
+                ], totals
+
+    documents, totals = asyncio.run(main())
+
+    assert [document["id"] for document in documents] == [d["id"] for d in DOCUMENTS]
+    assert totals == [len(DOCUMENTS)]
+    assert [query.get("cursor") for _, query in requests] == [None, "2", "4", "5"]
+    assert all(query["f.zuordnung"] == "BT" for _, query in requests)
+
+
+def test_rate_limit_spaces_requests(tmp_path):
+    started = []
+
+    async def file(request):
+        started.append(asyncio.get_running_loop().time())
+        return web.Response(body=b"x")
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/{name}", file)
+        async with _serve(app) as url:
+            async with AsyncDownloader.AsyncDownloader(rate_limit=20) as downloader:
+                await asyncio.gather(
+                    *(downloader.fetch(f"{url}/{i}", tmp_path / str(i)) for i in range(10))
+                )
+
+    asyncio.run(main())
+
+    assert len(started) == 10
+    # 10 requests at 20 per second take at least 9 intervals of 50 ms
+    assert max(started) - min(started) >= 9 / 20 * 0.9
+
+
+def test_download_data_repairs_truncated_file(tmp_path, monkeypatch):
+    requests = []
+    monkeypatch.chdir(tmp_path)
+
+    async def main():
+        async with _serve(_dip_app(requests)) as url:
+            monkeypatch.setattr(DataRetriever, "API_URL", url)
+            await DataRetriever._download_data("XML", 2021)
+
+            folder = tmp_path / "data" / "raw" / "XML"
+            files = sorted(folder.glob("speech-*.xml"))
+            assert len(files) == len(DOCUMENTS)
+            complete = files[2].read_bytes()
+            files[2].write_bytes(complete[:10])
+
+            requests.clear()
+            await DataRetriever._download_data("XML", 2021)
+            return folder, files[2], complete
+
+    folder, truncated, complete = asyncio.run(main())
+
+    assert truncated.read_bytes() == complete
+    # Only the changes since the first sync were listed and only the damaged file fetched
+    assert [path for path, _ in requests if path.startswith("/files")] == ["/files/3.xml"]
+    listings = [query for path, query in requests if path == "/plenarprotokoll"]
+    assert all("f.aktualisiert.start" in query for query in listings)
+    manifest = json.loads((folder / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["documents"]["3"]["size"] == len(complete)
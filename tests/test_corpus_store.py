@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+import polars as pl
+
+from ParlaMind.src import CorpusStore
+
+
+def _corpus(n: int = 3_000) -> pl.DataFrame:
+    parties = ["AfD", "CDU/CSU", "SPD", "FDP", "DIE LINKE"]
+    return pl.DataFrame(
+        {
+            "date": [date(2016, 1, 1) + timedelta(days=i % 3_000) for i in range(n)],
+            "abbreviation": [parties[i % len(parties)] for i in range(n)],
+            "firstName": [f"Vorname {i % 40}" for i in range(n)],
+            "lastName": [f"Nachname {i % 40}" for i in range(n)],
+            "speakerId": [str(11_000_000 + i % 40) for i in range(n)],
+            "speech": [f"Rede {i}" for i in range(n)],
+        }
+    )
+
+
+def test_read_corpus_with_year_and_party_filter(tmp_path):
+    df_parla = _corpus()
+    CorpusStore.write_corpus(
+        CorpusStore.encode_corpus(df_parla), tmp_path / "corpus", row_group_size=100
+    )
+
+    df = CorpusStore.read_corpus(
+        tmp_path / "corpus", start="2019-01-01", end="2019-12-31", parties=["AfD"]
+    )
+
+    expected = df_parla.filter(
+        pl.col("date").dt.year() == 2019, pl.col("abbreviation") == "AfD"
+    )
+    assert df.height == expected.height > 0
+    assert all(len(column) == df.height for column in df.get_columns())
+    assert df["year"].unique().to_list() == [2019]
+    assert df["wahlperiode"].unique().to_list() == [19]
+    assert sorted(df["speech"]) == sorted(expected["speech"])
+
+
+def test_read_corpus_without_matching_partition(tmp_path):
+    CorpusStore.write_corpus(CorpusStore.encode_corpus(_corpus()), tmp_path / "corpus")
+
+    df = CorpusStore.read_corpus(tmp_path / "corpus", start="1990-01-01", end="1990-12-31")
+
+    assert df.height == 0
+    assert {"wahlperiode", "year", "speech"} <= set(df.columns)
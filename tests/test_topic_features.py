@@ -0,0 +1,100 @@
+import json
+import random
+
+import numpy as np
+import polars as pl
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from ParlaMind.src import TopicFeatures, Tokenizer
+
+WORDS = (
+    "haushalt klimaschutz rente bundeswehr energie pflege schule digitalisierung "
+    "steuer migration europa wohnung bahn landwirtschaft gesundheit arbeit"
+).split()
+
+
+def _speeches(n: int = 300) -> pl.DataFrame:
+    rng = random.Random(0)
+    return pl.DataFrame(
+        {
+            "speechContent": [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))) + "."
+                for _ in range(n)
+            ]
+            + [None]
+        }
+    )
+
+
+def _sklearn_matrix(df_sample, cache_path, meta, n_features):
+    """TfidfVectorizer on the same token ids, for hashed columns with the column of
+    every n-gram as its token"""
+    token_ids = Tokenizer.add_token_ids(
+        df_sample.filter(pl.col("speechContent").is_not_null()),
+        cache_path,
+        meta["drop_stopwords"],
+    )["tokenIds"]
+    vocabulary = Tokenizer.load_vocabulary(cache_path)["token"].to_list()
+
+    low, high = meta["ngram_range"]
+    if n_features is None:
+        documents = [
+            [
+                " ".join(vocabulary[i] for i in ids[start : start + n])
+                for n in range(low, high + 1)
+                for start in range(len(ids) - n + 1)
+            ]
+            for ids in token_ids.to_list()
+        ]
+        vectorizer = TfidfVectorizer(analyzer=list, min_df=meta["min_df"], max_df=meta["max_df"])
+    else:
+        documents = [[] for _ in range(len(token_ids))]
+        for _, rows, keys, _, _ in TopicFeatures._ngrams(token_ids, (low, high)):
+            columns, _ = TopicFeatures._columns(keys, None, n_features)
+            for row, column in zip(rows, columns):
+                documents[row].append(str(column))
+        vectorizer = TfidfVectorizer(
+            analyzer=list, vocabulary={str(i): i for i in range(n_features)}
+        )
+    vectorizer.set_params(
+        sublinear_tf=meta["sublinear_tf"],
+        use_idf=meta["use_idf"],
+        norm="l2" if meta["norm"] else None,
+    )
+    return vectorizer.fit_transform(documents).tocsr(), vectorizer.get_feature_names_out()
+
+
+@pytest.mark.parametrize(
+    "n_features, kwargs",
+    [
+        (None, {"min_df": 3, "max_df": 0.5}),
+        (None, {"min_df": 0.01, "max_df": 0.9, "sublinear_tf": False, "chunk_size": 70}),
+        (1024, {"chunk_size": 70}),
+        (64, {"use_idf": False, "norm": False}),
+    ],
+)
+def test_build_matrix_matches_sklearn(tmp_path, n_features, kwargs):
+    df_sample = _speeches()
+    cache_path = tmp_path / "tokens"
+    path = TopicFeatures.build_matrix(
+        df_sample, tmp_path / "matrix", n_features=n_features, cache_path=cache_path, **kwargs
+    )
+    matrix, _, df_features = TopicFeatures.load_matrix(path)
+    with open(path / "matrix.json", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    expected, names = _sklearn_matrix(df_sample, cache_path, meta, n_features)
+
+    if n_features is None:
+        assert sorted(df_features["ngram"]) == sorted(names)
+        # Same column order as build_matrix
+        order = {ngram: i for i, ngram in enumerate(names)}
+        expected = expected[:, [order[ngram] for ngram in df_features["ngram"]]]
+    assert matrix.shape == expected.shape
+    expected.sort_indices()
+    matrix = matrix.tocsr()
+    matrix.sort_indices()
+    np.testing.assert_array_equal(matrix.indptr, expected.indptr)
+    np.testing.assert_array_equal(matrix.indices, expected.indices)
+    np.testing.assert_allclose(matrix.data, expected.data, rtol=1e-5, atol=1e-6)